@@ -4,6 +4,24 @@ import zipfile
 from lxml import etree
 from openpyxl.utils import coordinate_to_tuple, column_index_from_string
 import re
+import sys
+import json
+import argparse
+from package_patch import create_patch, patch_path_for
+from xlsx_package import (
+    find_sheet_part,
+    load_shared_strings_from_archive,
+    parse_row_window,
+    read_cell_values,
+    read_merged_refs,
+    read_sheet_root,
+    root_namespace_declarations,
+    serialize_row_window,
+    split_row_window,
+    update_cells_inline,
+    verify_embedded_objects_preserved,
+    write_package,
+)
 
 NS = {"ns": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
 
@@ -63,12 +81,13 @@ def get_merged_ranges_for_target_column(merged_ranges, target_column):
     target_ranges.sort(key=lambda x: x['start_row'])
     return target_ranges
 
-def map_values_to_merged_cells_fixed(cluster_values, target_ranges, start_row):
+def map_values_to_merged_cells_fixed(cluster_values, target_ranges, start_row, verbose=True):
     cell_value_mapping = {}
     value_index = 0
     
-    print(f"Mapping {len(cluster_values)} values to cells starting from row {start_row}")
-    print(f"Found {len(target_ranges)} merged ranges starting with target column")
+    if verbose:
+        print(f"Mapping {len(cluster_values)} values to cells starting from row {start_row}")
+        print(f"Found {len(target_ranges)} merged ranges starting with target column")
     
     sorted_ranges = sorted(target_ranges, key=lambda x: x['start_row'])
     
@@ -89,7 +108,8 @@ def map_values_to_merged_cells_fixed(cluster_values, target_ranges, start_row):
             if current_row == current_merge_range['start_row']:
                 top_left_cell = current_merge_range['start_cell']
                 cell_value_mapping[top_left_cell] = cluster_values[value_index]
-                print(f"  Merged range {current_merge_range['range']}: {top_left_cell} = '{cluster_values[value_index]}'")
+                if verbose:
+                    print(f"  Merged range {current_merge_range['range']}: {top_left_cell} = '{cluster_values[value_index]}'")
                 value_index += 1
             
             current_row = current_merge_range['end_row'] + 1
@@ -99,12 +119,14 @@ def map_values_to_merged_cells_fixed(cluster_values, target_ranges, start_row):
                 target_col = "AG"
             cell_ref = f"{target_col}{current_row}"
             cell_value_mapping[cell_ref] = cluster_values[value_index]
-            print(f"  Individual cell {cell_ref} = '{cluster_values[value_index]}'")
+            if verbose:
+                print(f"  Individual cell {cell_ref} = '{cluster_values[value_index]}'")
             value_index += 1
             current_row += 1
     
-    print(f"  Total cells to update: {len(cell_value_mapping)}")
-    print(f"  Used {value_index} out of {len(cluster_values)} values")
+    if verbose:
+        print(f"  Total cells to update: {len(cell_value_mapping)}")
+        print(f"  Used {value_index} out of {len(cluster_values)} values")
     
     return cell_value_mapping
 
@@ -191,80 +213,7 @@ def replace_existing_cells(source_path, destination_folder, cluster_values, star
         
         print(f"\nStarting to update cells...")
         
-        replaced_count = 0
-        created_rows = 0
-        created_cells = 0
-        
-        for cell_ref, val in cell_value_mapping.items():
-            row_num = int(''.join(filter(str.isdigit, cell_ref)))
-            
-            print(f"Processing cell {cell_ref} with value '{val}'")
-            
-            row_element = None
-            for row in sheet_data.findall("ns:row", namespaces=NS):
-                if int(row.get("r", "0")) == row_num:
-                    row_element = row
-                    break
-            
-            if row_element is None:
-                row_element = etree.Element(f"{{{NS['ns']}}}row")
-                row_element.set("r", str(row_num))
-                
-                inserted = False
-                for j, existing_row in enumerate(sheet_data.findall("ns:row", namespaces=NS)):
-                    existing_row_num = int(existing_row.get("r", "0"))
-                    if existing_row_num > row_num:
-                        sheet_data.insert(j, row_element)
-                        inserted = True
-                        break
-                
-                if not inserted:
-                    sheet_data.append(row_element)
-                
-                created_rows += 1
-                print(f"  Created new row {row_num}")
-            
-            cell = None
-            for c in row_element.findall("ns:c", namespaces=NS):
-                if c.get("r") == cell_ref:
-                    cell = c
-                    break
-            
-            if cell is None:
-                cell = etree.Element(f"{{{NS['ns']}}}c")
-                cell.set("r", cell_ref)
-                
-                col_letter_only = ''.join(filter(str.isalpha, cell_ref))
-                col_index = column_index_from_string(col_letter_only)
-                
-                inserted = False
-                for j, existing_cell in enumerate(row_element.findall("ns:c", namespaces=NS)):
-                    existing_ref = existing_cell.get("r", "A1")
-                    existing_col_str = ''.join(filter(str.isalpha, existing_ref))
-                    existing_col_index = column_index_from_string(existing_col_str)
-                    
-                    if existing_col_index > col_index:
-                        row_element.insert(j, cell)
-                        inserted = True
-                        break
-                
-                if not inserted:
-                    row_element.append(cell)
-                
-                created_cells += 1
-                print(f"  Created new cell {cell_ref}")
-            
-            for child in list(cell):
-                cell.remove(child)
-            
-            cell.set("t", "inlineStr")
-            
-            is_element = etree.SubElement(cell, f"{{{NS['ns']}}}is")
-            t_element = etree.SubElement(is_element, f"{{{NS['ns']}}}t")
-            t_element.text = str(val)
-            
-            replaced_count += 1
-            print(f"  Successfully updated {cell_ref} = '{val}'")
+        replaced_count, created_rows, created_cells = update_cells_inline(sheet_data, cell_value_mapping)
 
         print(f"\nSummary:")
         print(f"  - Updated {replaced_count} cells")
@@ -300,6 +249,82 @@ def replace_existing_cells(source_path, destination_folder, cluster_values, star
             shutil.rmtree(temp_dir)
             print("Temporary files cleaned up")
 
+def replace_existing_cells_windowed(source_path, destination_folder, cluster_values, start_cell, sheet_name="07.Analysis"):
+    """Same result as replace_existing_cells, but only the rows being filled are parsed
+    
+    Rows above the window are skipped by scanning their r attribute, rows
+    below it and every other package member are copied through untouched.
+    Falls back to replace_existing_cells when the sheet XML cannot be split.
+    """
+    os.makedirs(destination_folder, exist_ok=True)
+    dest_path = os.path.join(destination_folder, os.path.basename(source_path))
+
+    with zipfile.ZipFile(source_path, 'r') as zip_ref:
+        sheet_part = find_sheet_part(zip_ref, sheet_name)
+        sheet_bytes = zip_ref.read(sheet_part)
+    print(f"Found worksheet file: {sheet_part}")
+
+    merged_ranges = read_merged_refs(sheet_bytes)
+    print(f"Found {len(merged_ranges)} total merged cell ranges")
+
+    col_letter = ''.join(filter(str.isalpha, start_cell))
+    start_row = int(''.join(filter(str.isdigit, start_cell)))
+
+    target_ranges = get_merged_ranges_for_target_column(merged_ranges, col_letter)
+    cell_value_mapping = map_values_to_merged_cells_fixed(cluster_values, target_ranges, start_row)
+    if not cell_value_mapping:
+        print("No cells to update")
+        write_package(source_path, dest_path, {})
+        print(f"Excel file written: {dest_path}")
+        return
+
+    mapped_rows = [int(''.join(filter(str.isdigit, cell_ref))) for cell_ref in cell_value_mapping]
+    window = split_row_window(sheet_bytes, min(mapped_rows), max(mapped_rows))
+    if window is None:
+        print("Worksheet layout not supported for windowed mode, falling back to full parse")
+        return replace_existing_cells(source_path, destination_folder, cluster_values, start_cell)
+
+    before, window_bytes, after = window
+    print(f"Parsing rows {min(mapped_rows)}-{max(mapped_rows)} ({len(window_bytes)} of {len(sheet_bytes)} bytes)")
+
+    sheet_data = parse_row_window(window_bytes, root_namespace_declarations(sheet_bytes))
+    replaced_count, created_rows, created_cells = update_cells_inline(sheet_data, cell_value_mapping)
+
+    print(f"\nSummary:")
+    print(f"  - Updated {replaced_count} cells")
+    print(f"  - Created {created_rows} new rows") 
+    print(f"  - Created {created_cells} new cells")
+    print(f"  - Processed {len(target_ranges)} merged cell ranges")
+
+    write_package(source_path, dest_path, {sheet_part: before + serialize_row_window(sheet_data) + after})
+    print(f"Excel file written: {dest_path}")
+
+def plan_replace_existing_cells(source_path, cluster_values, start_cell, sheet_name="07.Analysis"):
+    """Compute the cells replace_existing_cells would change without writing anything"""
+    with zipfile.ZipFile(source_path, 'r') as zip_ref:
+        sheet_part = find_sheet_part(zip_ref, sheet_name)
+        sheet_root = read_sheet_root(zip_ref, sheet_part)
+        shared_strings = load_shared_strings_from_archive(zip_ref)
+
+    merged_ranges, _ = parse_merged_cells(sheet_root)
+
+    col_letter = ''.join(filter(str.isalpha, start_cell))
+    start_row = int(''.join(filter(str.isdigit, start_cell)))
+
+    target_ranges = get_merged_ranges_for_target_column(merged_ranges, col_letter)
+    cell_value_mapping = map_values_to_merged_cells_fixed(cluster_values, target_ranges, start_row, verbose=False)
+    old_values = read_cell_values(sheet_root, cell_value_mapping.keys(), shared_strings)
+
+    return {
+        'source': source_path,
+        'sheet': sheet_name,
+        'part': sheet_part,
+        'changes': [
+            {'cell': cell_ref, 'old': old_values.get(cell_ref), 'new': str(val)}
+            for cell_ref, val in cell_value_mapping.items()
+        ],
+    }
+
 def validate_excel_file(file_path):
     try:
         with zipfile.ZipFile(file_path, 'r') as zip_ref:
@@ -356,7 +381,32 @@ def get_user_inputs():
     
     return source_excel, destination_folder, start_cell, cluster_values
 
+def parse_plan_args(argv):
+    parser = argparse.ArgumentParser(description="Print the cells replace_existing_cells would change, one JSON document per workbook per line")
+    parser.add_argument("--plan", action="store_true")
+    parser.add_argument("--start-cell", required=True, help="Starting cell, e.g. AG11")
+    parser.add_argument("--value", action="append", required=True, dest="values", help="Cluster value; repeat for each value")
+    parser.add_argument("sources", nargs="+", help="Workbooks to plan")
+    return parser.parse_args(argv)
+
+def plan_main(argv):
+    """Non-interactive plan mode: only JSON goes to stdout, errors go to stderr"""
+    args = parse_plan_args(argv)
+    failed = 0
+    for source in args.sources:
+        try:
+            plan = plan_replace_existing_cells(source, args.values, args.start_cell.upper())
+        except Exception as e:
+            print(f"{source}: {e}", file=sys.stderr)
+            plan = {'source': source, 'error': str(e)}
+            failed += 1
+        print(json.dumps(plan))
+    return 1 if failed else 0
+
 if __name__ == "__main__":
+    if "--plan" in sys.argv:
+        exit(plan_main(sys.argv[1:]))
+    
     try:
         source_excel, destination_folder, start_cell, cluster_values = get_user_inputs()
         
@@ -379,14 +429,21 @@ if __name__ == "__main__":
             print("Source file validation failed. Please check the file.")
             exit(1)
         
-        replace_existing_cells(source_excel, destination_folder, cluster_values, start_cell)
+        if "--windowed" in sys.argv:
+            replace_existing_cells_windowed(source_excel, destination_folder, cluster_values, start_cell)
+        else:
+            replace_existing_cells(source_excel, destination_folder, cluster_values, start_cell)
         
         output_file = os.path.join(destination_folder, os.path.basename(source_excel))
-        if validate_excel_file(output_file):
+        if not validate_excel_file(output_file):
+            print("\n❌ WARNING: Output file may have issues")
+        elif not verify_embedded_objects_preserved(source_excel, output_file)['preserved']:
+            print("\n❌ WARNING: Embedded objects were not preserved")
+        else:
             print("\n✅ SUCCESS: File processed successfully!")
             print(f"Output file: {output_file}")
-        else:
-            print("\n❌ WARNING: Output file may have issues")
+            if "--patch" in sys.argv:
+                create_patch(source_excel, output_file, patch_path_for(output_file))
             
     except KeyboardInterrupt:
         print("\n\nOperation cancelled by user.")
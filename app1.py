@@ -8,6 +8,26 @@ import zipfile
 from lxml import etree
 from openpyxl.utils import coordinate_to_tuple, column_index_from_string, get_column_letter
 import re
+import sys
+import json
+import argparse
+from package_patch import create_patch, patch_path_for
+from xlsx_package import (
+    dimension_last_row,
+    extend_dimension,
+    find_sheet_part,
+    get_cell_value_with_shared_strings,
+    inline_string_row,
+    last_row_number,
+    load_shared_strings_from_archive,
+    locate_sheet_data,
+    parse_shared_strings,
+    read_cell_values,
+    read_sheet_root,
+    update_cells_inline,
+    verify_embedded_objects_preserved,
+    write_package,
+)
 
 NS = {"ns": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
 
@@ -18,21 +38,8 @@ def load_shared_strings(temp_dir):
     
     if os.path.exists(shared_strings_path):
         try:
-            shared_strings_tree = etree.parse(shared_strings_path)
-            sst_ns = {"ns": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
-            
-            for si in shared_strings_tree.xpath("//ns:si", namespaces=sst_ns):
-                t_elem = si.find("ns:t", namespaces=sst_ns)
-                if t_elem is not None and t_elem.text:
-                    shared_strings.append(t_elem.text)
-                else:
-                    r_elems = si.findall("ns:r", namespaces=sst_ns)
-                    text_parts = []
-                    for r_elem in r_elems:
-                        t_elem = r_elem.find("ns:t", namespaces=sst_ns)
-                        if t_elem is not None and t_elem.text:
-                            text_parts.append(t_elem.text)
-                    shared_strings.append("".join(text_parts))
+            with open(shared_strings_path, 'rb') as f:
+                shared_strings = parse_shared_strings(f.read())
             
             print(f"Loaded {len(shared_strings)} shared strings")
         except Exception as e:
@@ -40,43 +47,6 @@ def load_shared_strings(temp_dir):
     
     return shared_strings
 
-def get_cell_value_with_shared_strings(cell, shared_strings):
-    """Extract cell value from XML element including shared strings"""
-    if cell is None:
-        return None
-        
-    cell_type = cell.get("t")
-    
-    if cell_type == "inlineStr":
-        is_elem = cell.find("ns:is", namespaces=NS)
-        if is_elem is not None:
-            t_elem = is_elem.find("ns:t", namespaces=NS)
-            if t_elem is not None and t_elem.text:
-                return t_elem.text.strip()
-    
-    elif cell_type == "s":
-        v_elem = cell.find("ns:v", namespaces=NS)
-        if v_elem is not None and v_elem.text:
-            try:
-                string_index = int(v_elem.text)
-                if 0 <= string_index < len(shared_strings):
-                    return shared_strings[string_index].strip()
-            except (ValueError, IndexError):
-                pass
-    
-    elif cell_type == "str" or cell_type is None or cell_type == "":
-        v_elem = cell.find("ns:v", namespaces=NS)
-        if v_elem is not None and v_elem.text:
-            return v_elem.text.strip()
-    
-    f_elem = cell.find("ns:f", namespaces=NS)
-    if f_elem is not None:
-        v_elem = cell.find("ns:v", namespaces=NS)
-        if v_elem is not None and v_elem.text:
-            return v_elem.text.strip()
-    
-    return None
-
 def find_all_cells_with_content(sheet_tree, shared_strings):
     """Find all cells with content for debugging"""
     sheet_data = sheet_tree.find(".//ns:sheetData", namespaces=NS)
@@ -96,7 +66,7 @@ def find_all_cells_with_content(sheet_tree, shared_strings):
     
     return all_cells
 
-def find_column_by_header_flexible(sheet_tree, header_names, shared_strings):
+def find_column_by_header_flexible(sheet_tree, header_names, shared_strings, verbose=True):
     """Find column by header name with flexible matching - prioritize exact matches"""
     sheet_data = sheet_tree.find(".//ns:sheetData", namespaces=NS)
     if sheet_data is None:
@@ -121,10 +91,12 @@ def find_column_by_header_flexible(sheet_tree, header_names, shared_strings):
                     
                     if cell_value_clean == header_clean:
                         col_letter = ''.join(filter(str.isalpha, cell_ref))
-                        print(f"Found '{header_name}' (exact match) at {cell_ref} (Column: {col_letter}, Row: {row_num})")
+                        if verbose:
+                            print(f"Found '{header_name}' (exact match) at {cell_ref} (Column: {col_letter}, Row: {row_num})")
                         return col_letter, row_num
     
-    print(f"No exact match found, searching for partial matches...")
+    if verbose:
+        print(f"No exact match found, searching for partial matches...")
     for row in sheet_data.findall("ns:row", namespaces=NS):
         row_num = int(row.get("r", "0"))
         for cell in row.findall("ns:c", namespaces=NS):
@@ -140,7 +112,8 @@ def find_column_by_header_flexible(sheet_tree, header_names, shared_strings):
                     if (header_clean in cell_value_clean and len(header_clean) > 3) or \
                        (cell_value_clean in header_clean and len(cell_value_clean) > 3):
                         col_letter = ''.join(filter(str.isalpha, cell_ref))
-                        print(f"Found '{header_name}' (partial match: '{cell_value}') at {cell_ref} (Column: {col_letter}, Row: {row_num})")
+                        if verbose:
+                            print(f"Found '{header_name}' (partial match: '{cell_value}') at {cell_ref} (Column: {col_letter}, Row: {row_num})")
                         return col_letter, row_num
     
     return None, None
@@ -203,7 +176,7 @@ def get_column_values(sheet_tree, col_letter, start_row, shared_strings):
     column_values.sort(key=lambda x: x['row'])
     return column_values
 
-def create_mapping_for_analysis_column(items_values, analysis_col, keyword_map):
+def create_mapping_for_analysis_column(items_values, analysis_col, keyword_map, verbose=True):
     """Create mapping for analysis column based on items values"""
     cell_value_mapping = {}
     
@@ -217,15 +190,18 @@ def create_mapping_for_analysis_column(items_values, analysis_col, keyword_map):
             for key, value in keyword_map.items():
                 if key.lower() in item_value.lower() or item_value.lower() in key.lower():
                     mapped_value = value
-                    print(f"  Partial match found: '{item_value}' -> '{key}' -> '{mapped_value}'")
+                    if verbose:
+                        print(f"  Partial match found: '{item_value}' -> '{key}' -> '{mapped_value}'")
                     break
         
         if mapped_value:
             analysis_cell_ref = f"{analysis_col}{item_row}"
             cell_value_mapping[analysis_cell_ref] = mapped_value
-            print(f"  Mapping: {item_value} -> {mapped_value} at {analysis_cell_ref}")
+            if verbose:
+                print(f"  Mapping: {item_value} -> {mapped_value} at {analysis_cell_ref}")
         else:
-            print(f"  Warning: No mapping found for '{item_value}' in keyword_map")
+            if verbose:
+                print(f"  Warning: No mapping found for '{item_value}' in keyword_map")
     
     return cell_value_mapping
 
@@ -341,80 +317,7 @@ def update_analysis_cells(source_path, destination_folder, keyword_map):
         
         print(f"\nStarting to update {len(cell_value_mapping)} cells...")
         
-        replaced_count = 0
-        created_rows = 0
-        created_cells = 0
-        
-        for cell_ref, val in cell_value_mapping.items():
-            row_num = int(''.join(filter(str.isdigit, cell_ref)))
-            
-            print(f"Processing cell {cell_ref} with value '{val}'")
-            
-            row_element = None
-            for row in sheet_data.findall("ns:row", namespaces=NS):
-                if int(row.get("r", "0")) == row_num:
-                    row_element = row
-                    break
-            
-            if row_element is None:
-                row_element = etree.Element(f"{{{NS['ns']}}}row")
-                row_element.set("r", str(row_num))
-                
-                inserted = False
-                for j, existing_row in enumerate(sheet_data.findall("ns:row", namespaces=NS)):
-                    existing_row_num = int(existing_row.get("r", "0"))
-                    if existing_row_num > row_num:
-                        sheet_data.insert(j, row_element)
-                        inserted = True
-                        break
-                
-                if not inserted:
-                    sheet_data.append(row_element)
-                
-                created_rows += 1
-                print(f"  Created new row {row_num}")
-            
-            cell = None
-            for c in row_element.findall("ns:c", namespaces=NS):
-                if c.get("r") == cell_ref:
-                    cell = c
-                    break
-            
-            if cell is None:
-                cell = etree.Element(f"{{{NS['ns']}}}c")
-                cell.set("r", cell_ref)
-                
-                col_letter_only = ''.join(filter(str.isalpha, cell_ref))
-                col_index = column_index_from_string(col_letter_only)
-                
-                inserted = False
-                for j, existing_cell in enumerate(row_element.findall("ns:c", namespaces=NS)):
-                    existing_ref = existing_cell.get("r", "A1")
-                    existing_col_str = ''.join(filter(str.isalpha, existing_ref))
-                    existing_col_index = column_index_from_string(existing_col_str)
-                    
-                    if existing_col_index > col_index:
-                        row_element.insert(j, cell)
-                        inserted = True
-                        break
-                
-                if not inserted:
-                    row_element.append(cell)
-                
-                created_cells += 1
-                print(f"  Created new cell {cell_ref}")
-            
-            for child in list(cell):
-                cell.remove(child)
-            
-            cell.set("t", "inlineStr")
-            
-            is_element = etree.SubElement(cell, f"{{{NS['ns']}}}is")
-            t_element = etree.SubElement(is_element, f"{{{NS['ns']}}}t")
-            t_element.text = str(val)
-            
-            replaced_count += 1
-            print(f"  Successfully updated {cell_ref} = '{val}'")
+        replaced_count, created_rows, created_cells = update_cells_inline(sheet_data, cell_value_mapping)
 
         print(f"\nSummary:")
         print(f"  - Updated {replaced_count} cells")
@@ -449,6 +352,83 @@ def update_analysis_cells(source_path, destination_folder, keyword_map):
             shutil.rmtree(temp_dir)
             print("Temporary files cleaned up")
 
+def append_row_values(source_path, destination_folder, row_values, sheet_name="07.Analysis"):
+    """Append a {column letter: value} row after the last used row, touching only the end of the sheet
+    
+    The last row comes from a backwards scan of the sheetData tail, falling
+    back to the <dimension> element. Existing rows are copied through unparsed.
+    """
+    os.makedirs(destination_folder, exist_ok=True)
+    dest_path = os.path.join(destination_folder, os.path.basename(source_path))
+    row_values = {col.upper(): val for col, val in row_values.items()}
+    if not row_values:
+        raise ValueError("No values to append")
+
+    with zipfile.ZipFile(source_path, 'r') as zip_ref:
+        sheet_part = find_sheet_part(zip_ref, sheet_name)
+        sheet_bytes = zip_ref.read(sheet_part)
+
+    located = locate_sheet_data(sheet_bytes)
+    if located is None:
+        raise ValueError("sheetData element not found in worksheet")
+    head, data_start, data_end, tail = located
+
+    last_row = last_row_number(sheet_bytes, data_start, data_end)
+    if last_row is None:
+        last_row = dimension_last_row(sheet_bytes)
+    if last_row is None:
+        raise ValueError("Cannot determine the last used row")
+
+    new_row = last_row + 1
+    print(f"Last used row: {last_row}, appending at row {new_row}")
+
+    col_indexes = [column_index_from_string(col) for col in row_values]
+    head = extend_dimension(head, new_row, min(col_indexes), max(col_indexes))
+    new_sheet_bytes = head + sheet_bytes[data_start:data_end] + inline_string_row(new_row, row_values) + tail
+
+    write_package(source_path, dest_path, {sheet_part: new_sheet_bytes})
+    print(f"Appended {len(row_values)} cells to row {new_row}: {dest_path}")
+    return new_row
+
+def plan_analysis_cells(source_path, keyword_map, sheet_name="07.Analysis"):
+    """Compute the cells update_analysis_cells would change without writing anything"""
+    with zipfile.ZipFile(source_path, 'r') as zip_ref:
+        sheet_part = find_sheet_part(zip_ref, sheet_name)
+        sheet_root = read_sheet_root(zip_ref, sheet_part)
+        shared_strings = load_shared_strings_from_archive(zip_ref)
+
+    items_col, items_header_row = find_column_by_header_flexible(
+        sheet_root, 
+        ["Items", "Item", "Item Name", "Item Type", "Test Items"], 
+        shared_strings,
+        verbose=False
+    )
+    if not items_col:
+        raise ValueError("'Items' column not found")
+
+    analysis_col, _ = find_column_by_header_flexible(
+        sheet_root, 
+        ["Analysis", "Analyse", "Result", "Results", "Status"], 
+        shared_strings,
+        verbose=False
+    )
+    if not analysis_col:
+        raise ValueError("'Analysis' column not found")
+
+    items_values = get_column_values(sheet_root, items_col, items_header_row, shared_strings)
+    cell_value_mapping = create_mapping_for_analysis_column(items_values, analysis_col, keyword_map, verbose=False)
+    old_values = read_cell_values(sheet_root, cell_value_mapping.keys(), shared_strings)
+
+    return {
+        'source': source_path,
+        'sheet': sheet_name,
+        'part': sheet_part,
+        'changes': [
+            {'cell': cell_ref, 'old': old_values.get(cell_ref), 'new': str(val)}
+            for cell_ref, val in cell_value_mapping.items()
+        ],
+    }
+
 def validate_excel_file(file_path):
     try:
         with zipfile.ZipFile(file_path, 'r') as zip_ref:
@@ -488,6 +468,30 @@ def get_user_inputs():
     
     return source_excel, destination_folder
 
+def parse_plan_args(argv):
+    parser = argparse.ArgumentParser(description="Print the cells update_analysis_cells would change, one JSON document per workbook per line")
+    parser.add_argument("--plan", action="store_true")
+    parser.add_argument("--keyword-map", help="JSON file mapping item keywords to Analysis text (default: the built-in map)")
+    parser.add_argument("sources", nargs="+", help="Workbooks to plan")
+    return parser.parse_args(argv)
+
+def plan_main(argv, keyword_map):
+    """Non-interactive plan mode: only JSON goes to stdout, errors go to stderr"""
+    args = parse_plan_args(argv)
+    if args.keyword_map:
+        with open(args.keyword_map, 'r', encoding="utf-8") as f:
+            keyword_map = json.load(f)
+    failed = 0
+    for source in args.sources:
+        try:
+            plan = plan_analysis_cells(source, keyword_map)
+        except Exception as e:
+            print(f"{source}: {e}", file=sys.stderr)
+            plan = {'source': source, 'error': str(e)}
+            failed += 1
+        print(json.dumps(plan))
+    return 1 if failed else 0
+
 if __name__ == "__main__":
     
     keyword_map = {
@@ -499,6 +503,9 @@ if __name__ == "__main__":
        
     }
     
+    if "--plan" in sys.argv:
+        exit(plan_main(sys.argv[1:], keyword_map))
+    
     try:
         source_excel, destination_folder = get_user_inputs()
         
@@ -507,6 +514,11 @@ if __name__ == "__main__":
         print(f"Destination: {destination_folder}")
         print(f"Keyword mappings: {keyword_map}")      
         
+        if "--append" in sys.argv:
+            row_values = json.loads(input("Enter row values as JSON (e.g. {\"B\": \"Tilt\", \"C\": \"Tilt Report\"}): "))
+            append_row_values(source_excel, destination_folder, row_values)
+            exit(0)
+        
         
         if not os.path.exists(source_excel):
             print(f"Error: Source file does not exist: {source_excel}")
@@ -519,11 +531,15 @@ if __name__ == "__main__":
         update_analysis_cells(source_excel, destination_folder, keyword_map)
         
         output_file = os.path.join(destination_folder, os.path.basename(source_excel))
-        if validate_excel_file(output_file):
+        if not validate_excel_file(output_file):
+            print("\n❌ WARNING: Output file may have issues")
+        elif not verify_embedded_objects_preserved(source_excel, output_file)['preserved']:
+            print("\n❌ WARNING: Embedded objects were not preserved")
+        else:
             print("\n✅ SUCCESS: File processed successfully!")
             print(f"Output file: {output_file}")
-        else:
-            print("\n❌ WARNING: Output file may have issues")
+            if "--patch" in sys.argv:
+                create_patch(source_excel, output_file, patch_path_for(output_file))
             
     except KeyboardInterrupt:
         print("\n\nOperation cancelled by user.")
@@ -0,0 +1,216 @@
+"""
+This script builds a persistent inverted index of cell text across workbooks, so values such as "Swap Check" or a cluster ID can be located without reopening every xlsx.
+Each package is indexed in one streaming pass over all of its worksheets and stored as <index_dir>/<sha256 of the package>.json, so unchanged files are never indexed twice.
+sources.json maps each workbook path to its current hash; searches only use those indexes, and an edited workbook's old index is dropped when it is re-indexed.
+Workbooks that no longer exist are dropped from sources.json on the next build, and only files named like an index are ever deleted.
+"""
+import os
+import re
+import sys
+import json
+import bisect
+import hashlib
+import argparse
+import zipfile
+
+from xlsx_package import iter_sheet_cells, list_sheet_parts, load_shared_strings_from_archive
+
+LOOKUP_MODES = ("exact", "prefix", "substring")
+
+def normalize_text(text):
+    """Case-fold and collapse whitespace so lookups ignore formatting differences"""
+    return " ".join(text.split()).casefold()
+
+def package_hash(file_path):
+    """SHA-256 of the package bytes"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class CellIndex:
+    """Normalized cell text -> [(sheet, cell_ref), ...] for one package"""
+
+    def __init__(self, package_hash, source, sheets, terms, postings):
+        self.package_hash = package_hash
+        self.source = source
+        self.sheets = sheets
+        self.terms = terms
+        self.postings = postings
+
+    @classmethod
+    def build(cls, xlsx_path, digest=None):
+        """Index every worksheet of a package in one streaming pass"""
+        postings_by_term = {}
+        sheets = []
+
+        with zipfile.ZipFile(xlsx_path, 'r') as zip_ref:
+            shared_strings = load_shared_strings_from_archive(zip_ref)
+            for sheet_name, sheet_part in list_sheet_parts(zip_ref):
+                if sheet_part not in zip_ref.NameToInfo:
+                    continue
+                sheet_index = len(sheets)
+                sheets.append(sheet_name)
+                for cell_ref, _, value in iter_sheet_cells(zip_ref, sheet_part, shared_strings):
+                    if not value or cell_ref is None:
+                        continue
+                    term = normalize_text(value)
+                    if term:
+                        postings_by_term.setdefault(term, []).append((sheet_index, cell_ref))
+
+        terms = sorted(postings_by_term)
+        postings = [postings_by_term[term] for term in terms]
+        return cls(digest or package_hash(xlsx_path), os.path.abspath(xlsx_path), sheets, terms, postings)
+
+    @classmethod
+    def load(cls, index_path):
+        with open(index_path, 'r', encoding="utf-8") as f:
+            data = json.load(f)
+        postings = [[tuple(posting) for posting in term_postings] for term_postings in data['postings']]
+        return cls(data['package_hash'], data['source'], data['sheets'], data['terms'], postings)
+
+    def save(self, index_path):
+        temp_path = index_path + ".tmp"
+        with open(temp_path, 'w', encoding="utf-8") as f:
+            json.dump({
+                'package_hash': self.package_hash,
+                'source': self.source,
+                'sheets': self.sheets,
+                'terms': self.terms,
+                'postings': self.postings,
+            }, f, separators=(",", ":"))
+        os.replace(temp_path, index_path)
+
+    def matching_terms(self, text, mode="exact"):
+        """Indexes into self.terms that match text under the given mode"""
+        needle = normalize_text(text)
+        if mode == "exact":
+            position = bisect.bisect_left(self.terms, needle)
+            if position < len(self.terms) and self.terms[position] == needle:
+                return [position]
+            return []
+        if mode == "prefix":
+            start = bisect.bisect_left(self.terms, needle)
+            end = start
+            while end < len(self.terms) and self.terms[end].startswith(needle):
+                end += 1
+            return list(range(start, end))
+        if mode == "substring":
+            return [position for position, term in enumerate(self.terms) if needle in term]
+        raise ValueError(f"Unknown lookup mode: {mode!r} (expected one of {LOOKUP_MODES})")
+
+    def lookup(self, text, mode="exact"):
+        """Return [{'text', 'sheet', 'cell'}, ...] for cells whose text matches"""
+        results = []
+        for position in self.matching_terms(text, mode):
+            for sheet_index, cell_ref in self.postings[position]:
+                results.append({'text': self.terms[position], 'sheet': self.sheets[sheet_index], 'cell': cell_ref})
+        return results
+
+SOURCE_MAP_NAME = "sources.json"
+INDEX_FILE_NAME = re.compile(r"[0-9a-f]{64}\.json")
+
+def index_path_for(index_dir, digest):
+    return os.path.join(index_dir, f"{digest}.json")
+
+def load_source_map(index_dir):
+    """Absolute workbook path -> hash of the package last indexed at that path"""
+    source_map_path = os.path.join(index_dir, SOURCE_MAP_NAME)
+    if not os.path.exists(source_map_path):
+        return {}
+    with open(source_map_path, 'r', encoding="utf-8") as f:
+        return json.load(f)
+
+def save_source_map(index_dir, source_map):
+    source_map_path = os.path.join(index_dir, SOURCE_MAP_NAME)
+    temp_path = source_map_path + ".tmp"
+    with open(temp_path, 'w', encoding="utf-8") as f:
+        json.dump(source_map, f, indent=1, sort_keys=True)
+    os.replace(temp_path, source_map_path)
+
+def remove_missing_sources(source_map):
+    """Drop workbook paths that no longer exist; returns True if any were dropped"""
+    missing = [source for source in source_map if not os.path.exists(source)]
+    for source in missing:
+        del source_map[source]
+    return bool(missing)
+
+def remove_unreferenced_indexes(index_dir, source_map):
+    """Delete stored indexes that no workbook path points at any more
+
+    Only <sha256>.json files are considered, so other files kept in
+    index_dir are never touched.
+    """
+    current = set(source_map.values())
+    for name in os.listdir(index_dir):
+        if INDEX_FILE_NAME.fullmatch(name) and name[:-len(".json")] not in current:
+            os.remove(os.path.join(index_dir, name))
+
+def index_package(xlsx_path, index_dir):
+    """Load the stored index for a package, building and saving it first if the package is new
+
+    The workbook path is then pointed at this hash, paths whose workbook
+    is gone are forgotten, and indexes nothing points at any more are dropped.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    digest = package_hash(xlsx_path)
+    index_path = index_path_for(index_dir, digest)
+
+    if os.path.exists(index_path):
+        index = CellIndex.load(index_path)
+    else:
+        index = CellIndex.build(xlsx_path, digest)
+        index.save(index_path)
+        print(f"Indexed {xlsx_path}: {len(index.terms)} distinct values in {len(index.sheets)} sheets")
+
+    source = os.path.abspath(xlsx_path)
+    source_map = load_source_map(index_dir)
+    removed = remove_missing_sources(source_map)
+    if removed or source_map.get(source) != digest:
+        source_map[source] = digest
+        save_source_map(index_dir, source_map)
+        remove_unreferenced_indexes(index_dir, source_map)
+    return index
+
+def search_index_dir(index_dir, text, mode="exact"):
+    """Look text up in the current index of every workbook, without touching the workbooks themselves"""
+    sources_by_hash = {}
+    for source, digest in load_source_map(index_dir).items():
+        if not os.path.exists(source):
+            continue
+        sources_by_hash.setdefault(digest, []).append(source)
+
+    results = []
+    for digest in sorted(sources_by_hash):
+        index_path = index_path_for(index_dir, digest)
+        if not os.path.exists(index_path):
+            continue
+        matches = CellIndex.load(index_path).lookup(text, mode)
+        for source in sorted(sources_by_hash[digest]):
+            for match in matches:
+                results.append(dict(match, source=source, package_hash=digest))
+    return results
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Index and search cell text across workbooks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Index workbooks")
+    build_parser.add_argument("index_dir")
+    build_parser.add_argument("files", nargs="+")
+
+    search_parser = subparsers.add_parser("search", help="Search stored indexes")
+    search_parser.add_argument("index_dir")
+    search_parser.add_argument("text")
+    search_parser.add_argument("--mode", choices=LOOKUP_MODES, default="exact")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if args.command == "build":
+        for file_path in args.files:
+            index_package(file_path, args.index_dir)
+    else:
+        for match in search_index_dir(args.index_dir, args.text, args.mode):
+            print(f"{match['source']}\t{match['sheet']}!{match['cell']}\t{match['text']}")
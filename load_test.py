@@ -0,0 +1,331 @@
+"""
+This script replays a corpus of workbooks through update_analysis_cells and replace_existing_cells at a configurable concurrency and rate.
+It reports throughput, p50/p95/p99 latency, RSS sampled during the run, and error counts. Jobs run in a process pool by default, like the watch daemon. Everything runs locally; when no corpus is given
+synthetic workbooks (07.Analysis sheet with Items/Analysis columns, merged AG blocks and an embedded media part) are generated.
+"""
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+import threading
+import multiprocessing
+import contextlib
+from collections import Counter
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from openpyxl import Workbook
+
+from app import replace_existing_cells
+from app1 import update_analysis_cells
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+KEYWORD_MAP = {
+    "Tilt": "Tilt Report",
+    "GPL": "Pre Post",
+    "Tilt Table": "Tilt Report",
+    "MRJ": "MRJ is attached",
+    "Swap Check": "Swap report is added",
+}
+ITEMS = ["Tilt", "GPL", "MRJ", "Swap Check", "Tilt Table"]
+JOB_MODES = ("analysis", "replace", "mixed")
+POOL_TYPES = ("process", "thread")
+
+def make_synthetic_workbook(path, rows=200, merged_blocks=20, media_bytes=256 * 1024):
+    """Write a workbook shaped like the ones both update scripts expect"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "07.Analysis"
+    ws["B2"] = "Items"
+    ws["C2"] = "Analysis"
+    for i in range(rows):
+        ws.cell(row=3 + i, column=2, value=ITEMS[i % len(ITEMS)])
+        ws.cell(row=3 + i, column=4, value=i)
+    for block in range(merged_blocks):
+        start_row = 11 + block * 3
+        ws.merge_cells(f"AG{start_row}:AH{start_row + 2}")
+        ws[f"AG{start_row}"] = f"Cluster {block}"
+    wb.save(path)
+
+    with zipfile.ZipFile(path, 'a') as zip_ref:
+        zip_ref.writestr("xl/media/image1.png", os.urandom(media_bytes), compress_type=zipfile.ZIP_STORED)
+    return path
+
+def collect_corpus(paths, work_dir, synthetic_count, rows):
+    """Supplied .xlsx files (or folders of them), or freshly generated synthetic workbooks"""
+    corpus = []
+    for path in paths:
+        if os.path.isdir(path):
+            corpus.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.lower().endswith(".xlsx"))
+        else:
+            corpus.append(path)
+
+    if not corpus:
+        corpus_dir = os.path.join(work_dir, "corpus")
+        os.makedirs(corpus_dir, exist_ok=True)
+        paths = [os.path.join(corpus_dir, f"synthetic_{i}.xlsx") for i in range(synthetic_count)]
+        # Generated in a separate fresh process so openpyxl's memory never counts towards the measured run
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as generator:
+            corpus.extend(generator.map(make_synthetic_workbook, paths, [rows] * len(paths)))
+    return corpus
+
+def current_rss_bytes(pid="self"):
+    """Resident set size of a process right now, or None where it cannot be read"""
+    try:
+        with open(f"/proc/{pid}/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def peak_rss_bytes():
+    """Peak RSS of the calling process over its whole life"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def silence_output():
+    """Pool initializer: drop the update functions' progress output"""
+    sys.stdout = sys.stderr = open(os.devnull, 'w')
+
+def run_one(job_index, source_path, mode, destination_folder):
+    if mode == "mixed":
+        mode = "analysis" if job_index % 2 == 0 else "replace"
+    if mode == "analysis":
+        update_analysis_cells(source_path, destination_folder, KEYWORD_MAP)
+    else:
+        replace_existing_cells(source_path, destination_folder, [f"Job {job_index} value {i}" for i in range(5)], "AG11")
+
+def timed_job(job_index, source_path, mode, destination_root, shared_destination):
+    """Run one job in a pool worker; returns (started, finished, error type, error message, pid, worker peak RSS)"""
+    if shared_destination:
+        destination_folder = destination_root
+    else:
+        destination_folder = os.path.join(destination_root, f"worker_{os.getpid()}_{threading.get_ident()}")
+
+    started = time.perf_counter()
+    error_type = error_message = None
+    try:
+        run_one(job_index, source_path, mode, destination_folder)
+    except Exception as e:
+        error_type, error_message = type(e).__name__, str(e)
+    return started, time.perf_counter(), error_type, error_message, os.getpid(), peak_rss_bytes()
+
+def run_load(corpus, destination_root, mode="mixed", concurrency=4, rate=0.0, jobs=200, duration=None, shared_destination=False, pool="process"):
+    """Replay the corpus and return a report dict
+
+    pool="process" runs jobs in worker processes like the watch daemon does;
+    pool="thread" keeps them in this process, where the GIL serializes most
+    of the Python work, so throughput understates what processes achieve.
+    Latency is measured from each job's scheduled start, so time spent
+    waiting for a free worker under an over-driven rate shows up in the tail.
+    Jobs normally get a destination folder per worker; shared_destination
+    points every job at one folder to expose contention there.
+    RSS is sampled across this process and its workers during the run only.
+    """
+    if pool not in POOL_TYPES:
+        raise ValueError(f"Unknown pool type: {pool!r} (expected one of {POOL_TYPES})")
+    os.makedirs(destination_root, exist_ok=True)
+    latencies = []
+    service_times = []
+    errors = Counter()
+    error_samples = {}
+    rss_samples = []
+    worker_pids = set()
+    worker_peaks = {}
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(concurrency)
+
+    pool_broken = threading.Event()
+
+    def job_done(future, scheduled_at):
+        try:
+            started, finished, error_type, error_message, pid, worker_peak = future.result()
+        except Exception as e:
+            # A worker died (e.g. OOM-killed) or the job never ran; nothing more can be scheduled on a broken pool
+            if isinstance(e, BrokenExecutor):
+                pool_broken.set()
+            with lock:
+                errors[type(e).__name__] += 1
+                error_samples.setdefault(type(e).__name__, str(e))
+            return
+        finally:
+            slots.release()
+        with lock:
+            latencies.append(finished - scheduled_at)
+            service_times.append(finished - started)
+            if pid != os.getpid():
+                worker_pids.add(pid)
+                worker_peaks[pid] = worker_peak
+            if error_type is not None:
+                errors[error_type] += 1
+                error_samples.setdefault(error_type, error_message)
+
+    def total_rss():
+        with lock:
+            pids = list(worker_pids)
+        sizes = [current_rss_bytes()] + [current_rss_bytes(pid) for pid in pids]
+        return None if sizes[0] is None else sum(size for size in sizes if size is not None)
+
+    def sample_rss(stop):
+        while not stop.wait(0.25):
+            rss = total_rss()
+            if rss is not None:
+                rss_samples.append(rss)
+
+    stop_sampling = threading.Event()
+    sampler = threading.Thread(target=sample_rss, args=(stop_sampling,), daemon=True)
+    start_rss = current_rss_bytes()
+    if start_rss is not None:
+        rss_samples.append(start_rss)
+
+    if pool == "process":
+        executor = ProcessPoolExecutor(max_workers=concurrency, initializer=silence_output)
+    else:
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        sampler.start()
+        started = time.perf_counter()
+        submitted = 0
+        with executor:
+            while submitted < jobs and not pool_broken.is_set():
+                scheduled_at = started + submitted / rate if rate else time.perf_counter()
+                if duration is not None and scheduled_at - started >= duration:
+                    break
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                slots.acquire()
+                if pool_broken.is_set():
+                    slots.release()
+                    break
+                try:
+                    future = executor.submit(timed_job, submitted, corpus[submitted % len(corpus)], mode, destination_root, shared_destination)
+                except BrokenExecutor:
+                    slots.release()
+                    pool_broken.set()
+                    break
+                future.add_done_callback(lambda done, scheduled_at=scheduled_at: job_done(done, scheduled_at))
+                submitted += 1
+            end_rss = total_rss()
+            if end_rss is not None:
+                rss_samples.append(end_rss)
+        elapsed = time.perf_counter() - started
+        stop_sampling.set()
+        sampler.join()
+
+    latencies.sort()
+    service_times.sort()
+    completed = len(latencies)
+    return {
+        'mode': mode,
+        'pool': pool,
+        'concurrency': concurrency,
+        'target_rate': rate or None,
+        'jobs': completed,
+        'submitted': submitted,
+        'pool_broken': pool_broken.is_set(),
+        'errors': sum(errors.values()),
+        'errors_by_type': dict(errors),
+        'error_samples': error_samples,
+        'elapsed_seconds': round(elapsed, 3),
+        'jobs_per_second': round(completed / elapsed, 2) if elapsed else None,
+        'latency_seconds': {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1] if latencies else None,
+        },
+        'service_seconds': {
+            'p50': percentile(service_times, 50),
+            'p95': percentile(service_times, 95),
+            'p99': percentile(service_times, 99),
+        },
+        'rss_bytes': {
+            'start': start_rss,
+            'end': end_rss,
+            'run_peak': max(rss_samples) if rss_samples else None,
+            'max_worker_peak': max(worker_peaks.values()) if worker_peaks else None,
+        },
+    }
+
+def print_report(report):
+    def ms(value):
+        return "n/a" if value is None else f"{value * 1000:.1f} ms"
+
+    def mb(value):
+        return "n/a" if value is None else f"{value / (1024 * 1024):.1f} MB"
+
+    print(f"\n=== Load test: {report['mode']} x{report['concurrency']} ({report['pool']} pool) ===")
+    if report['pool'] == "thread":
+        print("  Note: threads share one GIL, so throughput understates the process pool the watch daemon uses")
+    print(f"  Jobs: {report['jobs']} in {report['elapsed_seconds']}s ({report['jobs_per_second']} jobs/s)")
+    latency = report['latency_seconds']
+    print(f"  Latency: p50 {ms(latency['p50'])}, p95 {ms(latency['p95'])}, p99 {ms(latency['p99'])}, max {ms(latency['max'])}")
+    service = report['service_seconds']
+    print(f"  Service time: p50 {ms(service['p50'])}, p95 {ms(service['p95'])}, p99 {ms(service['p99'])}")
+    rss = report['rss_bytes']
+    print(f"  RSS (this process + workers): start {mb(rss['start'])}, end {mb(rss['end'])}, run peak {mb(rss['run_peak'])}")
+    if rss['max_worker_peak'] is not None:
+        print(f"  Largest single worker peak: {mb(rss['max_worker_peak'])}")
+    if report['pool_broken']:
+        print(f"  Worker pool broke (a worker process died); stopped after scheduling {report['submitted']} jobs")
+    print(f"  Errors: {report['errors']}")
+    for error_type, count in report['errors_by_type'].items():
+        print(f"    {error_type} x{count}: {report['error_samples'][error_type]}")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Load-test the workbook update path")
+    parser.add_argument("corpus", nargs="*", help=".xlsx files or folders (default: generate synthetic workbooks)")
+    parser.add_argument("--mode", choices=JOB_MODES, default="mixed")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pool", choices=POOL_TYPES, default="process", help="Run jobs in worker processes (like the watch daemon) or threads")
+    parser.add_argument("--rate", type=float, default=0.0, help="Jobs started per second (0 = as fast as possible)")
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=None, help="Stop scheduling jobs after this many seconds")
+    parser.add_argument("--synthetic", type=int, default=8, help="Synthetic workbooks to generate when no corpus is given")
+    parser.add_argument("--rows", type=int, default=200, help="Item rows per synthetic workbook")
+    parser.add_argument("--destination", help="Output folder (default: a temporary folder that is removed afterwards)")
+    parser.add_argument("--shared-destination", action="store_true", help="Point every job at the same output folder")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    work_dir = tempfile.mkdtemp(prefix="xlsx_load_")
+    try:
+        corpus = collect_corpus(args.corpus, work_dir, args.synthetic, args.rows)
+        report = run_load(
+            corpus,
+            args.destination or os.path.join(work_dir, "out"),
+            mode=args.mode,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            jobs=args.jobs,
+            duration=args.duration,
+            shared_destination=args.shared_destination,
+            pool=args.pool,
+        )
+        report['corpus_files'] = len(corpus)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_report(report)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
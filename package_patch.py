@@ -0,0 +1,148 @@
+"""
+This script turns an edited workbook into a compact patch against its source package, and applies such patches.
+A patch is a zip holding only the members that differ from the source plus a manifest of the source's central-directory entries.
+A source member is reused whenever its content (CRC and size) matches the edited file, so scripts that repack every member still
+get a patch holding only what they changed. The manifest records each output member's timestamp, compression and attributes.
+Applying it checks the source against the manifest, then copies every unchanged member from the original package under the edited
+file's metadata: raw when the compression matches, otherwise decompressed and recompressed.
+"""
+import os
+import sys
+import json
+import zipfile
+import argparse
+
+from xlsx_package import read_member_raw, write_member_raw
+
+MANIFEST_NAME = "manifest.json"
+PARTS_PREFIX = "parts/"
+PATCH_FORMAT = 3
+
+def member_fingerprint(info):
+    """[CRC32, size]: members that agree on both have the same content"""
+    return [info.CRC, info.file_size]
+
+def member_metadata(info):
+    """The header fields of an output member that a rebuild has to reproduce"""
+    return {
+        'date_time': list(info.date_time),
+        'compress_type': info.compress_type,
+        'create_system': info.create_system,
+        'external_attr': info.external_attr,
+        'internal_attr': info.internal_attr,
+    }
+
+def copy_source_member(zip_out, source_zip, name, metadata):
+    """Write a source member under the edited file's metadata"""
+    info = source_zip.getinfo(name)
+    zinfo = zipfile.ZipInfo(name, tuple(metadata['date_time']))
+    zinfo.compress_type = metadata['compress_type']
+    zinfo.create_system = metadata['create_system']
+    zinfo.external_attr = metadata['external_attr']
+    zinfo.internal_attr = metadata['internal_attr']
+    if info.compress_type == zinfo.compress_type:
+        zinfo.CRC = info.CRC
+        zinfo.file_size = info.file_size
+        zinfo.flag_bits = info.flag_bits
+        write_member_raw(zip_out, zinfo, read_member_raw(source_zip, info))
+    else:
+        zip_out.writestr(zinfo, source_zip.read(info))
+
+def source_fingerprint(zip_ref):
+    """name -> member fingerprint for every member, from the central directory only"""
+    return {info.filename: member_fingerprint(info) for info in zip_ref.infolist()}
+
+def create_patch(source_path, output_path, patch_path):
+    """Write a patch that rebuilds output_path from source_path"""
+    temp_path = patch_path + ".tmp"
+    with zipfile.ZipFile(source_path, 'r') as source_zip, zipfile.ZipFile(output_path, 'r') as output_zip:
+        fingerprint = source_fingerprint(source_zip)
+        members = []
+
+        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as patch_zip:
+            for info in output_zip.infolist():
+                if fingerprint.get(info.filename) == member_fingerprint(info):
+                    members.append({'name': info.filename, 'from': "source", 'metadata': member_metadata(info)})
+                else:
+                    write_member_raw(patch_zip, info, read_member_raw(output_zip, info), name=PARTS_PREFIX + info.filename)
+                    members.append({'name': info.filename, 'from': "patch"})
+
+            patch_zip.writestr(MANIFEST_NAME, json.dumps({
+                'format': PATCH_FORMAT,
+                'source': fingerprint,
+                'members': members,
+            }))
+    os.replace(temp_path, patch_path)
+
+    changed = [member['name'] for member in members if member['from'] == "patch"]
+    print(f"Patch written: {patch_path} ({len(changed)} of {len(members)} parts, {os.path.getsize(patch_path)} bytes)")
+    for name in changed:
+        print(f"  {name}")
+    return changed
+
+def check_source(source_zip, manifest):
+    """Raise ValueError if the source package is not the one the patch was made against"""
+    expected = manifest['source']
+    actual = source_fingerprint(source_zip)
+    if actual == expected:
+        return
+
+    problems = []
+    for name in sorted(set(expected) | set(actual)):
+        if name not in actual:
+            problems.append(f"missing {name}")
+        elif name not in expected:
+            problems.append(f"unexpected {name}")
+        elif actual[name] != expected[name]:
+            problems.append(f"changed {name}")
+    raise ValueError(f"Source package does not match patch: {', '.join(problems[:10])}")
+
+def apply_patch(source_path, patch_path, output_path):
+    """Rebuild the patched workbook from the original package and a patch"""
+    temp_path = output_path + ".tmp"
+    with zipfile.ZipFile(source_path, 'r') as source_zip, zipfile.ZipFile(patch_path, 'r') as patch_zip:
+        manifest = json.loads(patch_zip.read(MANIFEST_NAME))
+        if manifest.get('format') != PATCH_FORMAT:
+            raise ValueError(f"Unsupported patch format: {manifest.get('format')!r}")
+        check_source(source_zip, manifest)
+
+        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as zip_out:
+            for member in manifest['members']:
+                if member['from'] == "source":
+                    copy_source_member(zip_out, source_zip, member['name'], member['metadata'])
+                else:
+                    info = patch_zip.getinfo(PARTS_PREFIX + member['name'])
+                    write_member_raw(zip_out, info, read_member_raw(patch_zip, info), name=member['name'])
+    os.replace(temp_path, output_path)
+
+    print(f"Patch applied: {output_path}")
+    return output_path
+
+def patch_path_for(output_path):
+    return os.path.splitext(output_path)[0] + ".xlsxpatch"
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Create or apply workbook patches")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser("create", help="Diff an edited workbook against its source")
+    create_parser.add_argument("source")
+    create_parser.add_argument("output")
+    create_parser.add_argument("patch", nargs="?", help="Patch file (default: <output>.xlsxpatch)")
+
+    apply_parser = subparsers.add_parser("apply", help="Rebuild an edited workbook from its source and a patch")
+    apply_parser.add_argument("source")
+    apply_parser.add_argument("patch")
+    apply_parser.add_argument("output")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    try:
+        if args.command == "create":
+            create_patch(args.source, args.output, args.patch or patch_path_for(args.output))
+        else:
+            apply_patch(args.source, args.patch, args.output)
+    except ValueError as e:
+        print(f"\n❌ ERROR: {str(e)}")
+        exit(1)
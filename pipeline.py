@@ -0,0 +1,212 @@
+"""
+This script chains transform stages over one workbook so the package is read once and written once.
+Every stage follows the same locate -> plan -> apply steps against a shared PackageContext, which opens the archive,
+parses each worksheet and builds its indexes (shared strings, merged ranges) only the first time a stage asks for them.
+The merged-column fill from app.py and the keyword-driven Analysis fill from app1.py are both available as stages.
+"""
+import os
+import sys
+import json
+import zipfile
+import argparse
+from abc import ABC, abstractmethod
+
+from app import get_merged_ranges_for_target_column, map_values_to_merged_cells_fixed, parse_merged_cells
+from app1 import create_mapping_for_analysis_column, find_column_by_header_flexible, get_column_values
+from xlsx_package import (
+    NS,
+    find_sheet_part,
+    load_shared_strings_from_archive,
+    read_sheet_root,
+    serialize_sheet,
+    update_cells_inline,
+    verify_embedded_objects_preserved,
+    write_package,
+)
+
+class PackageContext:
+    """One opened package shared by every stage of a pipeline"""
+
+    def __init__(self, source_path):
+        self.source_path = source_path
+        self.zip_ref = zipfile.ZipFile(source_path, 'r')
+        self._shared_strings = None
+        self._sheet_parts = {}
+        self._sheet_roots = {}
+        self._merged_ranges = {}
+        self.modified_parts = set()
+
+    def close(self):
+        self.zip_ref.close()
+
+    @property
+    def shared_strings(self):
+        if self._shared_strings is None:
+            self._shared_strings = load_shared_strings_from_archive(self.zip_ref)
+        return self._shared_strings
+
+    def sheet_part(self, sheet_name):
+        if sheet_name not in self._sheet_parts:
+            self._sheet_parts[sheet_name] = find_sheet_part(self.zip_ref, sheet_name)
+        return self._sheet_parts[sheet_name]
+
+    def sheet(self, sheet_name):
+        """Parsed worksheet root, parsed once and then shared (with any edits) across stages"""
+        sheet_part = self.sheet_part(sheet_name)
+        if sheet_part not in self._sheet_roots:
+            self._sheet_roots[sheet_part] = read_sheet_root(self.zip_ref, sheet_part)
+        return self._sheet_roots[sheet_part]
+
+    def merged_ranges(self, sheet_name):
+        if sheet_name not in self._merged_ranges:
+            self._merged_ranges[sheet_name], _ = parse_merged_cells(self.sheet(sheet_name))
+        return self._merged_ranges[sheet_name]
+
+    def write_cells(self, sheet_name, cell_value_mapping):
+        sheet_data = self.sheet(sheet_name).find("ns:sheetData", namespaces=NS)
+        if sheet_data is None:
+            raise ValueError("sheetData element not found in worksheet")
+        self.modified_parts.add(self.sheet_part(sheet_name))
+        return update_cells_inline(sheet_data, cell_value_mapping, verbose=False)
+
+    def modified_part_bytes(self):
+        return {sheet_part: serialize_sheet(self._sheet_roots[sheet_part]) for sheet_part in self.modified_parts}
+
+class Stage(ABC):
+    """A transform step: locate what it needs, plan the cell changes, apply them"""
+
+    name = "stage"
+
+    def __init__(self, sheet_name="07.Analysis"):
+        self.sheet_name = sheet_name
+
+    @abstractmethod
+    def locate(self, context):
+        """Find what the stage needs in the package; the result is passed to plan"""
+
+    @abstractmethod
+    def plan(self, context, located):
+        """Return the {cell_ref: value} changes to apply"""
+
+    def apply(self, context, cell_value_mapping):
+        return context.write_cells(self.sheet_name, cell_value_mapping)
+
+class MergedColumnFillStage(Stage):
+    """app.py's replace_existing_cells: fill values down the merged blocks of a column"""
+
+    name = "merged_fill"
+
+    def __init__(self, cluster_values, start_cell, sheet_name="07.Analysis"):
+        super().__init__(sheet_name)
+        self.cluster_values = cluster_values
+        self.start_cell = start_cell.upper()
+
+    def locate(self, context):
+        col_letter = ''.join(filter(str.isalpha, self.start_cell))
+        return get_merged_ranges_for_target_column(context.merged_ranges(self.sheet_name), col_letter)
+
+    def plan(self, context, target_ranges):
+        start_row = int(''.join(filter(str.isdigit, self.start_cell)))
+        return map_values_to_merged_cells_fixed(self.cluster_values, target_ranges, start_row, verbose=False)
+
+class KeywordAnalysisFillStage(Stage):
+    """app1.py's update_analysis_cells: map Items column values through keyword_map into the Analysis column"""
+
+    name = "analysis_fill"
+
+    def __init__(self, keyword_map, sheet_name="07.Analysis"):
+        super().__init__(sheet_name)
+        self.keyword_map = keyword_map
+
+    def locate(self, context):
+        sheet_root = context.sheet(self.sheet_name)
+        items_col, items_header_row = find_column_by_header_flexible(
+            sheet_root,
+            ["Items", "Item", "Item Name", "Item Type", "Test Items"],
+            context.shared_strings,
+            verbose=False
+        )
+        if not items_col:
+            raise ValueError("'Items' column not found")
+
+        analysis_col, _ = find_column_by_header_flexible(
+            sheet_root,
+            ["Analysis", "Analyse", "Result", "Results", "Status"],
+            context.shared_strings,
+            verbose=False
+        )
+        if not analysis_col:
+            raise ValueError("'Analysis' column not found")
+
+        return items_col, items_header_row, analysis_col
+
+    def plan(self, context, located):
+        items_col, items_header_row, analysis_col = located
+        items_values = get_column_values(context.sheet(self.sheet_name), items_col, items_header_row, context.shared_strings)
+        return create_mapping_for_analysis_column(items_values, analysis_col, self.keyword_map, verbose=False)
+
+STAGE_TYPES = {
+    MergedColumnFillStage.name: MergedColumnFillStage,
+    KeywordAnalysisFillStage.name: KeywordAnalysisFillStage,
+}
+
+def build_stages(stage_specs):
+    """Turn [{"stage": "merged_fill", ...}, ...] into Stage objects"""
+    stages = []
+    for spec in stage_specs:
+        spec = dict(spec)
+        stage_type = STAGE_TYPES.get(spec.pop("stage", None))
+        if stage_type is None:
+            raise ValueError(f"Unknown stage in {spec}; expected one of {sorted(STAGE_TYPES)}")
+        stages.append(stage_type(**spec))
+    return stages
+
+def run_pipeline(source_path, destination_folder, stages):
+    """Run stages in order over one read of source_path and write the result once"""
+    os.makedirs(destination_folder, exist_ok=True)
+    dest_path = os.path.join(destination_folder, os.path.basename(source_path))
+
+    context = PackageContext(source_path)
+    results = []
+    try:
+        for stage in stages:
+            located = stage.locate(context)
+            cell_value_mapping = stage.plan(context, located)
+            replaced_count, created_rows, created_cells = stage.apply(context, cell_value_mapping)
+            results.append({
+                'stage': stage.name,
+                'sheet': stage.sheet_name,
+                'updated_cells': replaced_count,
+                'created_rows': created_rows,
+                'created_cells': created_cells,
+            })
+            print(f"  {stage.name} on '{stage.sheet_name}': updated {replaced_count} cells")
+        replaced_parts = context.modified_part_bytes()
+    finally:
+        context.close()
+
+    write_package(source_path, dest_path, replaced_parts)
+    print(f"Excel file written: {dest_path}")
+    return results
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run a chain of update stages over one workbook")
+    parser.add_argument("source", help="Source .xlsx")
+    parser.add_argument("destination", help="Output folder")
+    parser.add_argument("stages", help=f"JSON file with a list of stage specs ({', '.join(sorted(STAGE_TYPES))})")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    try:
+        with open(args.stages, 'r', encoding="utf-8") as f:
+            stages = build_stages(json.load(f))
+        run_pipeline(args.source, args.destination, stages)
+        output_file = os.path.join(args.destination, os.path.basename(args.source))
+        if not verify_embedded_objects_preserved(args.source, output_file)['preserved']:
+            print("\n❌ WARNING: Embedded objects were not preserved")
+            exit(1)
+        print("\n✅ SUCCESS: File processed successfully!")
+    except Exception as e:
+        print(f"\n❌ ERROR: {str(e)}")
+        exit(1)
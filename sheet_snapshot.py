@@ -0,0 +1,134 @@
+"""
+Read-only, array-backed snapshot of a worksheet's cell values for inspection and analysis.
+Cells are kept as parallel arrays (row, column, type code, index into an interned string table) sorted by (row, column),
+so large sheets can be loaded and queried without holding an lxml tree or a dict of cell-ref strings.
+"""
+import bisect
+import zipfile
+from array import array
+
+from openpyxl.utils import column_index_from_string, coordinate_to_tuple, get_column_letter
+
+from xlsx_package import find_sheet_part, iter_sheet_cells, load_shared_strings_from_archive
+
+COLUMN_BITS = 15
+
+TYPE_CODES = {
+    "n": 0,
+    "s": 1,
+    "inlineStr": 2,
+    "str": 3,
+    "b": 4,
+    "e": 5,
+    "d": 6,
+}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+def cell_key(row, col):
+    return (row << COLUMN_BITS) | col
+
+def column_number(col):
+    return column_index_from_string(col) if isinstance(col, str) else col
+
+class SheetSnapshot:
+    """Cells with content, sorted by (row, column)"""
+
+    def __init__(self, keys, type_codes, value_indexes, strings):
+        self.keys = keys
+        self.type_codes = type_codes
+        self.value_indexes = value_indexes
+        self.strings = strings
+
+    @classmethod
+    def from_package(cls, xlsx_path, sheet_name="07.Analysis"):
+        """Stream one worksheet into a snapshot"""
+        keys = array('Q')
+        type_codes = array('B')
+        value_indexes = array('I')
+        strings = []
+        string_ids = {}
+
+        with zipfile.ZipFile(xlsx_path, 'r') as zip_ref:
+            shared_strings = load_shared_strings_from_archive(zip_ref)
+            sheet_part = find_sheet_part(zip_ref, sheet_name)
+            for cell_ref, cell_type, value in iter_sheet_cells(zip_ref, sheet_part, shared_strings):
+                if not value or cell_ref is None:
+                    continue
+
+                string_id = string_ids.get(value)
+                if string_id is None:
+                    string_id = string_ids[value] = len(strings)
+                    strings.append(value)
+
+                row, col = coordinate_to_tuple(cell_ref)
+                keys.append(cell_key(row, col))
+                type_codes.append(TYPE_CODES.get(cell_type or "n", 0))
+                value_indexes.append(string_id)
+
+        if any(keys[i] > keys[i + 1] for i in range(len(keys) - 1)):
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            keys = array('Q', (keys[i] for i in order))
+            type_codes = array('B', (type_codes[i] for i in order))
+            value_indexes = array('I', (value_indexes[i] for i in order))
+
+        return cls(keys, type_codes, value_indexes, strings)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def position(self, row, col):
+        """Index of the cell at (row, col), or None"""
+        key = cell_key(row, column_number(col))
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return index
+        return None
+
+    def get(self, cell_ref):
+        """Value of a cell such as 'AG11', or None if it is empty"""
+        row, col = coordinate_to_tuple(cell_ref)
+        return self.get_at(row, col)
+
+    def get_at(self, row, col):
+        index = self.position(row, col)
+        return None if index is None else self.strings[self.value_indexes[index]]
+
+    def get_type(self, cell_ref):
+        """Original cell type attribute ('n', 's', 'inlineStr', ...) or None if the cell is empty"""
+        row, col = coordinate_to_tuple(cell_ref)
+        index = self.position(row, col)
+        return None if index is None else TYPE_NAMES[self.type_codes[index]]
+
+    def row_of(self, index):
+        return self.keys[index] >> COLUMN_BITS
+
+    def column_of(self, index):
+        return self.keys[index] & ((1 << COLUMN_BITS) - 1)
+
+    def rows_between(self, first_row, last_row):
+        """Snapshot of rows first_row..last_row; a contiguous slice of the arrays"""
+        start = bisect.bisect_left(self.keys, cell_key(first_row, 0))
+        end = bisect.bisect_left(self.keys, cell_key(last_row + 1, 0))
+        return SheetSnapshot(self.keys[start:end], self.type_codes[start:end], self.value_indexes[start:end], self.strings)
+
+    def columns_between(self, first_col, last_col):
+        """Snapshot of columns first_col..last_col (letters or numbers)"""
+        first_col = column_number(first_col)
+        last_col = column_number(last_col)
+        column_mask = (1 << COLUMN_BITS) - 1
+        selected = [i for i, key in enumerate(self.keys) if first_col <= (key & column_mask) <= last_col]
+        return SheetSnapshot(
+            array('Q', (self.keys[i] for i in selected)),
+            array('B', (self.type_codes[i] for i in selected)),
+            array('I', (self.value_indexes[i] for i in selected)),
+            self.strings,
+        )
+
+    def items(self):
+        """Yield (cell_ref, value) in (row, column) order"""
+        for index in range(len(self.keys)):
+            yield f"{get_column_letter(self.column_of(index))}{self.row_of(index)}", self.strings[self.value_indexes[index]]
+
+    def to_dict(self):
+        """Same shape as find_all_cells_with_content"""
+        return dict(self.items())
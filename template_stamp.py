@@ -0,0 +1,174 @@
+"""
+This script stamps many filled copies of one template, the same way replace_existing_cells fills a merged column.
+The template is prepared once: unchanged members are kept pre-compressed, the worksheet XML is pre-split around the target cells
+and the merged-block layout is resolved. Each variant is then just its values spliced into the fragments plus an archive write.
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from app import get_merged_ranges_for_target_column, map_values_to_merged_cells_fixed, parse_merged_cells
+from xlsx_package import (
+    NS,
+    escape_xml_text,
+    find_sheet_part,
+    read_member_raw,
+    read_sheet_root,
+    serialize_sheet,
+    update_cells_inline,
+    write_member,
+    verify_embedded_objects_preserved,
+    write_member_raw,
+)
+
+class PreparedTemplate:
+    """A template split into reusable pieces for one start cell and number of values"""
+
+    def __init__(self, members, sheet_part, fragments, slot_order, cell_refs):
+        self.members = members
+        self.sheet_part = sheet_part
+        self.fragments = fragments
+        self.slot_order = slot_order
+        self.cell_refs = cell_refs
+
+    @property
+    def slot_count(self):
+        return len(self.cell_refs)
+
+    def render_sheet(self, cluster_values):
+        """Worksheet XML with the values spliced into the prepared fragments
+        
+        Raises ValueError for values XML 1.0 cannot hold, as update_cells_inline would.
+        """
+        if len(cluster_values) != self.slot_count:
+            raise ValueError(f"Template was prepared for {self.slot_count} values, got {len(cluster_values)}")
+        parts = [self.fragments[0]]
+        for slot, fragment in zip(self.slot_order, self.fragments[1:]):
+            parts.append(escape_xml_text(cluster_values[slot]).encode("utf-8"))
+            parts.append(fragment)
+        return b"".join(parts)
+
+    def stamp(self, cluster_values, dest_path, compresslevel=None):
+        """Write one filled copy of the template to dest_path"""
+        sheet_bytes = self.render_sheet(cluster_values)
+        temp_path = dest_path + ".tmp"
+        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as zip_out:
+            for info, raw_bytes in self.members:
+                if raw_bytes is None:
+                    write_member(zip_out, info, sheet_bytes, compresslevel)
+                else:
+                    write_member_raw(zip_out, info, raw_bytes)
+        os.replace(temp_path, dest_path)
+
+def prepare_template(source_path, start_cell, slot_count, sheet_name="07.Analysis"):
+    """Read the template once and split it around the cells that slot_count values would fill"""
+    col_letter = ''.join(filter(str.isalpha, start_cell))
+    start_row = int(''.join(filter(str.isdigit, start_cell)))
+
+    with zipfile.ZipFile(source_path, 'r') as zip_ref:
+        sheet_part = find_sheet_part(zip_ref, sheet_name)
+        sheet_root = read_sheet_root(zip_ref, sheet_part)
+        members = []
+        for info in zip_ref.infolist():
+            raw_bytes = None if info.filename == sheet_part else read_member_raw(zip_ref, info)
+            members.append((info, raw_bytes))
+
+    sheet_data = sheet_root.find("ns:sheetData", namespaces=NS)
+    if sheet_data is None:
+        raise ValueError("sheetData element not found in worksheet")
+
+    marker_id = uuid.uuid4().hex
+    markers = [f"@@STAMP{marker_id}_{slot}@@" for slot in range(slot_count)]
+
+    merged_ranges, _ = parse_merged_cells(sheet_root)
+    target_ranges = get_merged_ranges_for_target_column(merged_ranges, col_letter)
+    cell_value_mapping = map_values_to_merged_cells_fixed(markers, target_ranges, start_row, verbose=False)
+    update_cells_inline(sheet_data, cell_value_mapping, verbose=False)
+
+    pieces = re.split(rf"@@STAMP{marker_id}_(\d+)@@".encode("ascii"), serialize_sheet(sheet_root))
+    fragments = pieces[0::2]
+    slot_order = [int(slot) for slot in pieces[1::2]]
+    if sorted(slot_order) != list(range(slot_count)):
+        raise ValueError("Could not locate every target cell in the serialized worksheet")
+
+    print(f"Prepared template {os.path.basename(source_path)}: {slot_count} slots in {sheet_part}, {len(members) - 1} pre-compressed members")
+    return PreparedTemplate(members, sheet_part, fragments, slot_order, list(cell_value_mapping))
+
+_worker_template = None
+
+def init_worker(source_path, start_cell, slot_count, sheet_name, compresslevel):
+    """Pool initializer: each worker prepares the template once"""
+    global _worker_template
+    _worker_template = (prepare_template(source_path, start_cell, slot_count, sheet_name), compresslevel)
+
+def stamp_in_worker(dest_path, cluster_values):
+    template, compresslevel = _worker_template
+    template.stamp(cluster_values, dest_path, compresslevel)
+    return dest_path
+
+def stamp_many(source_path, start_cell, variants, destination_folder, sheet_name="07.Analysis", workers=None, compresslevel=None):
+    """Stamp every (file_name, cluster_values) variant into destination_folder
+
+    All variants must have the same number of values. The first variant is
+    stamped in this process and checked with verify_embedded_objects_preserved
+    before the rest are written. With workers > 1 the remaining variants are
+    spread over a process pool that prepares the template once per process.
+    """
+    variants = list(variants)
+    if not variants:
+        return []
+    slot_count = len(variants[0][1])
+    mismatched = [file_name for file_name, cluster_values in variants if len(cluster_values) != slot_count]
+    if mismatched:
+        raise ValueError(f"Every variant needs {slot_count} values (from the first variant); these differ: {', '.join(mismatched[:10])}")
+    os.makedirs(destination_folder, exist_ok=True)
+    jobs = [(os.path.join(destination_folder, file_name), cluster_values) for file_name, cluster_values in variants]
+
+    started = time.perf_counter()
+    template = prepare_template(source_path, start_cell, slot_count, sheet_name)
+    first_path, first_values = jobs[0]
+    template.stamp(first_values, first_path, compresslevel)
+    check = verify_embedded_objects_preserved(source_path, first_path)
+    if not check['preserved']:
+        raise ValueError(f"First stamped file failed verification: {first_path}")
+    dest_paths = [first_path]
+
+    if workers and workers > 1 and len(jobs) > 1:
+        rest = jobs[1:]
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(source_path, start_cell, slot_count, sheet_name, compresslevel),
+        ) as executor:
+            dest_paths.extend(executor.map(stamp_in_worker, *zip(*rest), chunksize=max(1, len(rest) // (workers * 8))))
+    else:
+        for dest_path, cluster_values in jobs[1:]:
+            template.stamp(cluster_values, dest_path, compresslevel)
+            dest_paths.append(dest_path)
+
+    elapsed = time.perf_counter() - started
+    print(f"Stamped {len(dest_paths)} files in {elapsed:.2f}s ({len(dest_paths) / elapsed:.0f} files/s)")
+    return dest_paths
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Stamp filled copies of a template workbook")
+    parser.add_argument("template", help="Template .xlsx")
+    parser.add_argument("start_cell", help="Starting cell, e.g. AG11")
+    parser.add_argument("variants", help="JSON file mapping output file name -> list of cluster values")
+    parser.add_argument("destination", help="Output folder")
+    parser.add_argument("--sheet", default="07.Analysis")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--compresslevel", type=int, default=None, help="Deflate level for the filled worksheet")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    with open(args.variants, 'r', encoding="utf-8") as f:
+        variants = json.load(f)
+    stamp_many(args.template, args.start_cell.upper(), variants.items(), args.destination, args.sheet, args.workers, args.compresslevel)
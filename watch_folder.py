@@ -0,0 +1,335 @@
+"""
+This script watches an inbox folder for workbooks and runs the existing update logic on each one in a bounded worker pool.
+Every <name>.xlsx needs a sidecar <name>.json job spec next to it, for example
+    {"mode": "replace", "start_cell": "AG11", "cluster_values": ["A", "B"]}
+    {"mode": "analysis", "keyword_map": {"Tilt": "Tilt Report"}}
+Outputs are moved atomically into the done folder, followed by a <name>.stats.json file; a name already used there gets the job's claim suffix.
+Jobs left claimed by a previous run that stopped abruptly are moved back into the inbox on startup.
+inotify is used to wake up when inotify_simple is installed, otherwise the inbox is polled.
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import signal
+import argparse
+import contextlib
+import traceback
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import app
+import app1
+from xlsx_package import verify_embedded_objects_preserved
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+WORK_DIR_NAME = ".work"
+STAGING_DIR_NAME = ".staging"
+
+def sidecar_path(xlsx_path):
+    return os.path.splitext(xlsx_path)[0] + ".json"
+
+def file_signature(path):
+    """(size, mtime) of a file, or None if it is gone"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+def scan_inbox(inbox, seen, settle_seconds):
+    """Return workbooks whose file and sidecar have not changed for settle_seconds
+
+    seen maps a workbook path to (signature, first time that signature was seen)
+    and is updated in place, which is what debounces partially written files.
+    """
+    now = time.monotonic()
+    ready = []
+    present = set()
+
+    for entry in os.scandir(inbox):
+        name = entry.name
+        if not entry.is_file() or not name.lower().endswith(".xlsx") or name.startswith(("~$", ".")):
+            continue
+
+        xlsx_path = entry.path
+        present.add(xlsx_path)
+        signature = (file_signature(xlsx_path), file_signature(sidecar_path(xlsx_path)))
+        if signature[0] is None or signature[1] is None:
+            seen.pop(xlsx_path, None)
+            continue
+
+        previous = seen.get(xlsx_path)
+        if previous is None or previous[0] != signature:
+            seen[xlsx_path] = (signature, now)
+        elif now - previous[1] >= settle_seconds:
+            ready.append(xlsx_path)
+
+    for xlsx_path in list(seen):
+        if xlsx_path not in present:
+            del seen[xlsx_path]
+
+    return sorted(ready)
+
+def claim_job(inbox, xlsx_path):
+    """Move a sidecar and its workbook into a private work folder so no other pass picks them up
+
+    The sidecar goes first; if the workbook then cannot be moved, the sidecar
+    is put back so the job stays in the inbox and is retried on a later scan.
+    """
+    name = os.path.basename(xlsx_path)
+    work_dir = os.path.join(inbox, WORK_DIR_NAME, f"{os.path.splitext(name)[0]}-{time.time_ns()}")
+    os.makedirs(work_dir)
+
+    claimed_xlsx = os.path.join(work_dir, name)
+    try:
+        os.rename(sidecar_path(xlsx_path), sidecar_path(claimed_xlsx))
+    except OSError:
+        os.rmdir(work_dir)
+        raise
+    try:
+        os.rename(xlsx_path, claimed_xlsx)
+    except OSError:
+        os.rename(sidecar_path(claimed_xlsx), sidecar_path(xlsx_path))
+        os.rmdir(work_dir)
+        raise
+    return work_dir, claimed_xlsx
+
+def requeue_claimed_jobs(inbox):
+    """Move workbooks and sidecars left in the work folder by an interrupted run back into the inbox"""
+    work_root = os.path.join(inbox, WORK_DIR_NAME)
+    requeued = 0
+    for entry in os.scandir(work_root):
+        if not entry.is_dir():
+            continue
+        names = [name for name in os.listdir(entry.path) if name.lower().endswith((".xlsx", ".json"))]
+        # Keep the workbook and its sidecar paired: rename both to the claim folder's name if either name is taken
+        rename = any(os.path.exists(os.path.join(inbox, name)) for name in names)
+        for name in names:
+            target_name = f"{entry.name}{os.path.splitext(name)[1]}" if rename else name
+            os.rename(os.path.join(entry.path, name), os.path.join(inbox, target_name))
+            if name.lower().endswith(".xlsx"):
+                requeued += 1
+        shutil.rmtree(entry.path, ignore_errors=True)
+    return requeued
+
+def run_job(work_dir, xlsx_path):
+    """Run one job inside a pool worker and return its stats"""
+    started = time.perf_counter()
+    output_folder = os.path.join(work_dir, "out")
+    log = io.StringIO()
+    stats = {
+        'file': os.path.basename(xlsx_path),
+        'input_bytes': os.path.getsize(xlsx_path),
+    }
+
+    try:
+        with open(sidecar_path(xlsx_path), 'r', encoding="utf-8") as f:
+            spec = json.load(f)
+        stats['mode'] = spec.get("mode")
+
+        with contextlib.redirect_stdout(log):
+            if spec.get("mode") == "replace":
+                app.replace_existing_cells(xlsx_path, output_folder, spec["cluster_values"], spec["start_cell"].upper())
+            elif spec.get("mode") == "analysis":
+                app1.update_analysis_cells(xlsx_path, output_folder, spec["keyword_map"])
+            else:
+                raise ValueError(f"Unknown job mode: {spec.get('mode')!r}")
+
+            output_path = os.path.join(output_folder, os.path.basename(xlsx_path))
+            if not os.path.exists(output_path):
+                raise ValueError("Job produced no output")
+            preserved = verify_embedded_objects_preserved(xlsx_path, output_path)['preserved']
+
+        stats['output'] = output_path
+        stats['output_bytes'] = os.path.getsize(output_path)
+        stats['preserved'] = preserved
+        stats['status'] = "done" if preserved else "not_preserved"
+    except Exception as e:
+        stats['status'] = "failed"
+        stats['error'] = str(e)
+        log.write(traceback.format_exc())
+
+    stats['seconds'] = round(time.perf_counter() - started, 4)
+    stats['log'] = log.getvalue()
+    return stats
+
+def write_json_atomic(path, data):
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+def move_atomic(source, destination):
+    """Move a file into place so readers never see a partial file, even across filesystems"""
+    staging_dir = os.path.join(os.path.dirname(destination), STAGING_DIR_NAME)
+    os.makedirs(staging_dir, exist_ok=True)
+    staged = os.path.join(staging_dir, os.path.basename(destination))
+    shutil.move(source, staged)
+    os.replace(staged, destination)
+
+def publish_stem(folder, stem, work_dir):
+    """Output stem in folder, with the claim suffix added when an earlier job already used the plain name"""
+    if not any(os.path.exists(os.path.join(folder, f"{stem}{suffix}")) for suffix in (".xlsx", ".stats.json")):
+        return stem
+    return os.path.basename(work_dir)
+
+def finish_job(work_dir, stats, done_folder, failed_folder):
+    """Publish a finished job's output and stats, or park its inputs in the failed folder
+
+    The stats file is always written last, so its presence means the job's
+    other files are already in place.
+    """
+    stem = os.path.splitext(stats['file'])[0]
+    log = stats.pop('log', "")
+
+    if stats['status'] == "done":
+        output_stem = publish_stem(done_folder, stem, work_dir)
+        stats['published_as'] = f"{output_stem}.xlsx"
+        move_atomic(stats.pop('output'), os.path.join(done_folder, stats['published_as']))
+        write_json_atomic(os.path.join(done_folder, f"{output_stem}.stats.json"), stats)
+        print(f"Done: {stats['file']} -> {stats['published_as']} in {stats['seconds']}s")
+    else:
+        os.makedirs(failed_folder, exist_ok=True)
+        stats.pop('output', None)
+        output_stem = publish_stem(failed_folder, stem, work_dir)
+        stats['published_as'] = f"{output_stem}.xlsx"
+        for name, target in ((stats['file'], f"{output_stem}.xlsx"), (f"{stem}.json", f"{output_stem}.json")):
+            if os.path.exists(os.path.join(work_dir, name)):
+                move_atomic(os.path.join(work_dir, name), os.path.join(failed_folder, target))
+        with open(os.path.join(failed_folder, f"{output_stem}.log"), 'w', encoding="utf-8") as f:
+            f.write(log)
+        write_json_atomic(os.path.join(failed_folder, f"{output_stem}.stats.json"), stats)
+        print(f"Failed: {stats['file']} ({stats['status']}) {stats.get('error', '')}")
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+def job_stats(future, xlsx_path):
+    """A finished future's stats, or failed stats if its worker process died"""
+    try:
+        return future.result()
+    except BrokenExecutor as e:
+        return {
+            'file': os.path.basename(xlsx_path),
+            'status': "failed",
+            'error': f"Worker process died while this job was queued or running: {e}",
+            'seconds': None,
+            'log': "",
+        }
+
+def ignore_sigint():
+    """Pool initializer: leave Ctrl+C to the main process, which drains running jobs"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def open_inotify(inbox):
+    if INotify is None:
+        return None
+    inotify = INotify()
+    inotify.add_watch(inbox, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+    return inotify
+
+def watch(inbox, done_folder, failed_folder=None, workers=None, poll_interval=2.0, settle_seconds=2.0, max_pending=None):
+    """Run the watch loop until interrupted"""
+    failed_folder = failed_folder or os.path.join(done_folder, "failed")
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or workers * 2
+    os.makedirs(done_folder, exist_ok=True)
+    os.makedirs(os.path.join(inbox, WORK_DIR_NAME), exist_ok=True)
+    requeued = requeue_claimed_jobs(inbox)
+    if requeued:
+        print(f"Requeued {requeued} jobs left in {WORK_DIR_NAME} by an earlier run")
+
+    inotify = open_inotify(inbox)
+    print(f"Watching {inbox} with {workers} workers ({'inotify' if inotify else 'polling'})")
+
+    seen = {}
+    pending = {}
+    totals = {'done': 0, 'failed': 0}
+
+    def collect(future):
+        work_dir, claimed_xlsx = pending.pop(future)
+        stats = job_stats(future, claimed_xlsx)
+        finish_job(work_dir, stats, done_folder, failed_folder)
+        totals['done' if stats['status'] == "done" else 'failed'] += 1
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=ignore_sigint)
+
+    def restart_pool():
+        """A dead worker fails every job still on the pool; park them all and start a fresh pool"""
+        nonlocal executor
+        print("Worker process died; failing its in-flight jobs and restarting the pool")
+        for future in list(pending):
+            collect(future)
+        executor.shutdown(wait=False)
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=ignore_sigint)
+
+    def submit(work_dir, claimed_xlsx):
+        try:
+            future = executor.submit(run_job, work_dir, claimed_xlsx)
+        except BrokenExecutor:
+            restart_pool()
+            future = executor.submit(run_job, work_dir, claimed_xlsx)
+        pending[future] = (work_dir, claimed_xlsx)
+
+    try:
+        while True:
+            for xlsx_path in scan_inbox(inbox, seen, settle_seconds):
+                if len(pending) >= max_pending:
+                    break
+                try:
+                    work_dir, claimed_xlsx = claim_job(inbox, xlsx_path)
+                except OSError as e:
+                    print(f"Could not claim {xlsx_path}: {e}")
+                    continue
+                seen.pop(xlsx_path, None)
+                submit(work_dir, claimed_xlsx)
+
+            if pending:
+                finished, _ = wait(pending, timeout=min(poll_interval, settle_seconds), return_when=FIRST_COMPLETED)
+                broken = False
+                for future in finished:
+                    broken = broken or isinstance(future.exception(), BrokenExecutor)
+                    collect(future)
+                if broken:
+                    restart_pool()
+            elif inotify is not None:
+                inotify.read(timeout=int(poll_interval * 1000))
+            else:
+                time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print(f"\nStopping, waiting for {len(pending)} running jobs...")
+        for future in list(pending):
+            collect(future)
+    finally:
+        executor.shutdown()
+
+    print(f"Processed {totals['done']} files, {totals['failed']} failed")
+    return totals
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Watch a folder and update incoming workbooks")
+    parser.add_argument("inbox", help="Folder where workbooks and their .json job specs are dropped")
+    parser.add_argument("done", help="Folder that receives finished workbooks and stats")
+    parser.add_argument("--failed", help="Folder for failed jobs (default: <done>/failed)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between inbox scans")
+    parser.add_argument("--settle-seconds", type=float, default=2.0, help="Seconds a file must stay unchanged before it is picked up")
+    parser.add_argument("--max-pending", type=int, default=None, help="Jobs claimed at once (default: 2x workers)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    watch(
+        args.inbox,
+        args.done,
+        failed_folder=args.failed,
+        workers=args.workers,
+        poll_interval=args.poll_interval,
+        settle_seconds=args.settle_seconds,
+        max_pending=args.max_pending,
+    )
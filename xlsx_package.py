@@ -0,0 +1,603 @@
+"""
+Package-level helpers shared by the Excel update scripts.
+Everything here works on the xlsx archive itself (central directory and individual parts) rather than on an extracted copy.
+"""
+import os
+import posixpath
+import re
+import struct
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from lxml import etree
+from xml.sax.saxutils import escape
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+NS = {"ns": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+RELS_NS = {"ns": "http://schemas.openxmlformats.org/package/2006/relationships"}
+R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+PRESERVED_PREFIXES = (
+    "xl/embeddings/",
+    "xl/media/",
+    "xl/charts/",
+    "xl/drawings/",
+)
+
+XML_PART_SUFFIXES = (".xml", ".rels", ".vml")
+
+ROOT_START_TAG = re.compile(rb'<(?![?!])[^>]*>')
+NAMESPACE_DECLARATION = re.compile(rb'\sxmlns(?::[\w.-]+)?="[^"]*"')
+SHEET_DATA_START = re.compile(rb'<sheetData\b[^>]*?(/?)>')
+SHEET_DATA_END = b'</sheetData>'
+ROW_START = re.compile(rb'<row\b([^>]*?)(/?)>')
+ROW_END = b'</row>'
+ROW_NUMBER = re.compile(rb'\sr="(\d+)"')
+MERGE_CELL_REF = re.compile(rb'<mergeCell\b[^>]*?\sref="([^"]+)"')
+DIMENSION_REF = re.compile(rb'(<dimension\b[^>]*?\sref=")([^"]*)(")')
+VALUE_CELL_TYPES = ("n", "b", "e", "d")
+INVALID_XML_CHARS = re.compile('[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+def parse_shared_strings(xml_bytes):
+    """Parse sharedStrings.xml content into a list of strings"""
+    shared_strings = []
+    shared_strings_tree = etree.fromstring(xml_bytes, etree.XMLParser(resolve_entities=False, huge_tree=True))
+    
+    for si in shared_strings_tree.iterfind("ns:si", namespaces=NS):
+        t_elem = si.find("ns:t", namespaces=NS)
+        if t_elem is not None and t_elem.text:
+            shared_strings.append(t_elem.text)
+        else:
+            text_parts = []
+            for r_elem in si.findall("ns:r", namespaces=NS):
+                t_elem = r_elem.find("ns:t", namespaces=NS)
+                if t_elem is not None and t_elem.text:
+                    text_parts.append(t_elem.text)
+            shared_strings.append("".join(text_parts))
+    
+    return shared_strings
+
+def load_shared_strings_from_archive(zip_ref):
+    """Load shared strings table straight from the archive"""
+    try:
+        xml_bytes = zip_ref.read("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    return parse_shared_strings(xml_bytes)
+
+def get_cell_value_with_shared_strings(cell, shared_strings):
+    """Extract cell value from XML element including shared strings"""
+    if cell is None:
+        return None
+        
+    cell_type = cell.get("t")
+    
+    if cell_type == "inlineStr":
+        is_elem = cell.find("ns:is", namespaces=NS)
+        if is_elem is not None:
+            t_elem = is_elem.find("ns:t", namespaces=NS)
+            if t_elem is not None and t_elem.text:
+                return t_elem.text.strip()
+    
+    elif cell_type == "s":
+        v_elem = cell.find("ns:v", namespaces=NS)
+        if v_elem is not None and v_elem.text:
+            try:
+                string_index = int(v_elem.text)
+                if 0 <= string_index < len(shared_strings):
+                    return shared_strings[string_index].strip()
+            except (ValueError, IndexError):
+                pass
+    
+    elif cell_type == "str" or cell_type is None or cell_type == "":
+        v_elem = cell.find("ns:v", namespaces=NS)
+        if v_elem is not None and v_elem.text:
+            return v_elem.text.strip()
+    
+    f_elem = cell.find("ns:f", namespaces=NS)
+    if f_elem is not None:
+        v_elem = cell.find("ns:v", namespaces=NS)
+        if v_elem is not None and v_elem.text:
+            return v_elem.text.strip()
+    
+    return None
+
+def get_cell_value(cell, shared_strings):
+    """Like get_cell_value_with_shared_strings, but also reads the <v> of number, boolean, error and date cells"""
+    value = get_cell_value_with_shared_strings(cell, shared_strings)
+    if value is None and cell.get("t") in VALUE_CELL_TYPES:
+        v_elem = cell.find("ns:v", namespaces=NS)
+        if v_elem is not None and v_elem.text:
+            return v_elem.text.strip()
+    return value
+
+def iter_sheet_cells(zip_ref, sheet_part, shared_strings):
+    """Stream (cell_ref, cell_type, value) for every cell of a worksheet without keeping the tree"""
+    cell_tag = f"{{{NS['ns']}}}c"
+    row_tag = f"{{{NS['ns']}}}row"
+    
+    with zip_ref.open(sheet_part) as f:
+        for _, elem in etree.iterparse(f, events=("end",), tag=(cell_tag, row_tag), resolve_entities=False, huge_tree=True):
+            if elem.tag == cell_tag:
+                yield elem.get("r"), elem.get("t"), get_cell_value(elem, shared_strings)
+            else:
+                elem.clear(keep_tail=True)
+                parent = elem.getparent()
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+def resolve_workbook_target(target):
+    """Turn a workbook.xml.rels Target into an archive member name"""
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join("xl", target))
+
+def list_sheet_parts(zip_ref):
+    """List (sheet name, worksheet part) pairs in workbook order"""
+    try:
+        workbook_root = etree.fromstring(zip_ref.read("xl/workbook.xml"))
+    except KeyError:
+        raise FileNotFoundError("workbook.xml not found")
+    try:
+        rels_root = etree.fromstring(zip_ref.read("xl/_rels/workbook.xml.rels"))
+    except KeyError:
+        raise FileNotFoundError("workbook.xml.rels not found")
+    
+    targets = {}
+    for rel in rels_root.iterfind("ns:Relationship", namespaces=RELS_NS):
+        targets[rel.get("Id")] = rel.get("Target")
+    
+    sheet_parts = []
+    for sheet in workbook_root.xpath("//ns:sheets/ns:sheet", namespaces=NS):
+        target = targets.get(sheet.get(R_ID))
+        if target:
+            sheet_parts.append((sheet.get("name"), resolve_workbook_target(target)))
+    
+    return sheet_parts
+
+def find_sheet_part(zip_ref, sheet_name):
+    """Return the worksheet part for a sheet name"""
+    sheet_parts = list_sheet_parts(zip_ref)
+    for name, part in sheet_parts:
+        if name == sheet_name:
+            if part not in zip_ref.NameToInfo:
+                raise FileNotFoundError(f"Worksheet file {part} not found")
+            return part
+    
+    print(f"Available sheets: {[name for name, _ in sheet_parts]}")
+    raise ValueError(f"Sheet '{sheet_name}' not found in the workbook")
+
+def read_sheet_root(zip_ref, sheet_part):
+    """Parse a worksheet part straight from the archive"""
+    parser = etree.XMLParser(resolve_entities=False, huge_tree=True)
+    return etree.fromstring(zip_ref.read(sheet_part), parser)
+
+def read_cell_values(sheet_root, cell_refs, shared_strings):
+    """Read the current values of the given cells in one pass over sheetData"""
+    wanted = set(cell_refs)
+    values = {}
+    for cell in sheet_root.iter(f"{{{NS['ns']}}}c"):
+        cell_ref = cell.get("r")
+        if cell_ref in wanted:
+            values[cell_ref] = get_cell_value(cell, shared_strings)
+            if len(values) == len(wanted):
+                break
+    return values
+
+def locate_sheet_data(sheet_bytes):
+    """Return (head, data_start, data_end, tail) for raw worksheet XML, or None if sheetData cannot be found
+    
+    head and tail are the bytes around the rows of sheetData, with a
+    self-closing <sheetData/> opened up so rows can be spliced in.
+    """
+    match = SHEET_DATA_START.search(sheet_bytes)
+    if match is None:
+        return None
+    
+    if match.group(1):
+        head = sheet_bytes[:match.end() - 2] + b'>'
+        tail = SHEET_DATA_END + sheet_bytes[match.end():]
+        return head, len(head), len(head), tail
+    
+    data_end = sheet_bytes.find(SHEET_DATA_END, match.end())
+    if data_end == -1:
+        return None
+    return sheet_bytes[:match.end()], match.end(), data_end, sheet_bytes[data_end:]
+
+def split_row_window(sheet_bytes, first_row, last_row):
+    """Split raw worksheet XML into (before, window, after) where window holds rows first_row..last_row
+    
+    Rows outside the window are only scanned for their r attribute and are
+    never parsed. Returns None when the sheet does not use plain <row r="...">
+    markup or a row in the window has no closing tag, so callers can fall
+    back to a full parse.
+    """
+    located = locate_sheet_data(sheet_bytes)
+    if located is None:
+        return None
+    head, data_start, data_end, tail = located
+    if data_start == data_end:
+        return head, b'', tail
+    
+    window_start = None
+    window_end = None
+    for row_match in ROW_START.finditer(sheet_bytes, data_start, data_end):
+        number_match = ROW_NUMBER.search(row_match.group(1))
+        if number_match is None:
+            return None
+        row_num = int(number_match.group(1))
+        
+        if row_num < first_row:
+            continue
+        if row_num > last_row:
+            if window_start is None:
+                window_start = window_end = row_match.start()
+            break
+        
+        if window_start is None:
+            window_start = row_match.start()
+        if row_match.group(2):
+            window_end = row_match.end()
+        else:
+            row_end = sheet_bytes.find(ROW_END, row_match.end(), data_end)
+            if row_end == -1:
+                return None
+            window_end = row_end + len(ROW_END)
+    
+    if window_start is None:
+        window_start = window_end = data_end
+    
+    return sheet_bytes[:window_start], sheet_bytes[window_start:window_end], sheet_bytes[window_end:]
+
+def root_namespace_declarations(sheet_bytes):
+    """Namespace declarations on the worksheet root element, needed to parse a fragment on its own"""
+    root_tag = ROOT_START_TAG.search(sheet_bytes)
+    if root_tag is None:
+        return b''
+    return b''.join(NAMESPACE_DECLARATION.findall(root_tag.group(0)))
+
+def parse_row_window(window_bytes, namespace_declarations):
+    """Parse a run of <row> elements into a detached sheetData element"""
+    parser = etree.XMLParser(resolve_entities=False, huge_tree=True)
+    return etree.fromstring(b'<sheetData' + namespace_declarations + b'>' + window_bytes + SHEET_DATA_END, parser)
+
+def serialize_row_window(sheet_data):
+    """Serialize the rows of a detached sheetData element without the wrapper"""
+    xml_bytes = etree.tostring(sheet_data, encoding="UTF-8", xml_declaration=False)
+    if xml_bytes.endswith(b'/>') and b'<row' not in xml_bytes:
+        return b''
+    return xml_bytes[xml_bytes.index(b'>') + 1:xml_bytes.rindex(b'</')]
+
+def last_row_number(sheet_bytes, data_start, data_end):
+    """Row number of the last <row> in sheetData, found by scanning backwards from its end
+    
+    Returns 0 for an empty sheetData and None if the last row has no r attribute.
+    """
+    position = data_end
+    while True:
+        position = sheet_bytes.rfind(b'<row', data_start, position)
+        if position == -1:
+            return 0
+        row_match = ROW_START.match(sheet_bytes, position)
+        if row_match is not None:
+            number_match = ROW_NUMBER.search(row_match.group(1))
+            return int(number_match.group(1)) if number_match else None
+
+def dimension_last_row(sheet_bytes):
+    """Last row according to the <dimension> element, or None if there is none"""
+    dimension = DIMENSION_REF.search(sheet_bytes)
+    if dimension is None:
+        return None
+    end_ref = dimension.group(2).decode("ascii").split(":")[-1]
+    row_digits = ''.join(filter(str.isdigit, end_ref))
+    return int(row_digits) if row_digits else None
+
+def extend_dimension(head_bytes, row_num, first_col, last_col):
+    """Grow the <dimension> ref in the bytes before sheetData so it covers the given row and columns"""
+    def replace(match):
+        refs = match.group(2).decode("ascii").split(":")
+        start_ref, end_ref = refs[0], refs[-1]
+        start_col = column_index_from_string(''.join(filter(str.isalpha, start_ref)) or "A")
+        end_col = column_index_from_string(''.join(filter(str.isalpha, end_ref)) or "A")
+        start_row = int(''.join(filter(str.isdigit, start_ref)) or row_num)
+        end_row = int(''.join(filter(str.isdigit, end_ref)) or row_num)
+        new_ref = (
+            f"{get_column_letter(min(start_col, first_col))}{min(start_row, row_num)}:"
+            f"{get_column_letter(max(end_col, last_col))}{max(end_row, row_num)}"
+        )
+        return match.group(1) + new_ref.encode("ascii") + match.group(3)
+    return DIMENSION_REF.sub(replace, head_bytes, count=1)
+
+def escape_xml_text(value):
+    """Escape a value for raw XML text, rejecting characters XML 1.0 forbids the same way lxml does"""
+    text = str(value)
+    if INVALID_XML_CHARS.search(text):
+        raise ValueError("All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters")
+    return escape(text)
+
+def inline_string_row(row_num, values_by_column):
+    """Raw XML for a new row of inline-string cells, columns in sheet order"""
+    cells = []
+    for col in sorted(values_by_column, key=column_index_from_string):
+        cell_ref = f"{col}{row_num}"
+        cells.append(f'<c r="{cell_ref}" t="inlineStr"><is><t>{escape_xml_text(values_by_column[col])}</t></is></c>')
+    return f'<row r="{row_num}">{"".join(cells)}</row>'.encode("utf-8")
+
+def read_merged_refs(sheet_bytes):
+    """Read mergeCell refs from raw worksheet XML without parsing it"""
+    located = locate_sheet_data(sheet_bytes)
+    start = located[2] if located else 0
+    return [ref.decode("ascii") for ref in MERGE_CELL_REF.findall(sheet_bytes, start)]
+
+def update_cells_inline(sheet_data, cell_value_mapping, verbose=True):
+    """Write each mapped value into sheetData as an inline string, creating rows and cells as needed"""
+    replaced_count = 0
+    created_rows = 0
+    created_cells = 0
+    
+    for cell_ref, val in cell_value_mapping.items():
+        row_num = int(''.join(filter(str.isdigit, cell_ref)))
+        
+        if verbose:
+            print(f"Processing cell {cell_ref} with value '{val}'")
+        
+        row_element = None
+        for row in sheet_data.findall("ns:row", namespaces=NS):
+            if int(row.get("r", "0")) == row_num:
+                row_element = row
+                break
+        
+        if row_element is None:
+            row_element = etree.Element(f"{{{NS['ns']}}}row")
+            row_element.set("r", str(row_num))
+            
+            inserted = False
+            for j, existing_row in enumerate(sheet_data.findall("ns:row", namespaces=NS)):
+                existing_row_num = int(existing_row.get("r", "0"))
+                if existing_row_num > row_num:
+                    sheet_data.insert(j, row_element)
+                    inserted = True
+                    break
+            
+            if not inserted:
+                sheet_data.append(row_element)
+            
+            created_rows += 1
+            if verbose:
+                print(f"  Created new row {row_num}")
+        
+        cell = None
+        for c in row_element.findall("ns:c", namespaces=NS):
+            if c.get("r") == cell_ref:
+                cell = c
+                break
+        
+        if cell is None:
+            cell = etree.Element(f"{{{NS['ns']}}}c")
+            cell.set("r", cell_ref)
+            
+            col_letter_only = ''.join(filter(str.isalpha, cell_ref))
+            col_index = column_index_from_string(col_letter_only)
+            
+            inserted = False
+            for j, existing_cell in enumerate(row_element.findall("ns:c", namespaces=NS)):
+                existing_ref = existing_cell.get("r", "A1")
+                existing_col_str = ''.join(filter(str.isalpha, existing_ref))
+                existing_col_index = column_index_from_string(existing_col_str)
+                
+                if existing_col_index > col_index:
+                    row_element.insert(j, cell)
+                    inserted = True
+                    break
+            
+            if not inserted:
+                row_element.append(cell)
+            
+            created_cells += 1
+            if verbose:
+                print(f"  Created new cell {cell_ref}")
+        
+        for child in list(cell):
+            cell.remove(child)
+        
+        cell.set("t", "inlineStr")
+        
+        is_element = etree.SubElement(cell, f"{{{NS['ns']}}}is")
+        t_element = etree.SubElement(is_element, f"{{{NS['ns']}}}t")
+        t_element.text = str(val)
+        
+        replaced_count += 1
+        if verbose:
+            print(f"  Successfully updated {cell_ref} = '{val}'")
+    
+    return replaced_count, created_rows, created_cells
+
+def serialize_sheet(sheet_root):
+    """Serialize a worksheet root the same way the update scripts write it"""
+    return etree.tostring(sheet_root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+def read_member_raw(zip_ref, info):
+    """Read the still-compressed bytes of a member"""
+    zip_ref.fp.seek(info.header_offset)
+    local_header = zip_ref.fp.read(30)
+    if local_header[:4] != b"PK\x03\x04":
+        raise zipfile.BadZipFile(f"Bad local file header for {info.filename}")
+    name_length, extra_length = struct.unpack("<HH", local_header[26:30])
+    zip_ref.fp.seek(info.header_offset + 30 + name_length + extra_length)
+    return zip_ref.fp.read(info.compress_size)
+
+def write_member_raw(zip_out, info, raw_bytes, name=None):
+    """Append already-compressed bytes to an archive open for writing, without recompressing"""
+    zinfo = zipfile.ZipInfo(name or info.filename, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.CRC = info.CRC
+    zinfo.file_size = info.file_size
+    zinfo.compress_size = len(raw_bytes)
+    zinfo.flag_bits = info.flag_bits & ~0x08
+    zinfo.create_system = info.create_system
+    zinfo.external_attr = info.external_attr
+    zinfo.internal_attr = info.internal_attr
+    
+    zip_out.fp.seek(zip_out.start_dir)
+    zinfo.header_offset = zip_out.start_dir
+    zip_out.fp.write(zinfo.FileHeader())
+    zip_out.fp.write(raw_bytes)
+    zip_out.start_dir = zip_out.fp.tell()
+    zip_out.filelist.append(zinfo)
+    zip_out.NameToInfo[zinfo.filename] = zinfo
+    return zinfo
+
+def write_member(zip_out, info, data, compresslevel=None):
+    """Write new content for a member, keeping its name and timestamp
+    
+    compresslevel is passed on explicitly, since writestr ignores the
+    archive's own level for a ZipInfo.
+    """
+    zinfo = zipfile.ZipInfo(info.filename, info.date_time)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo.external_attr = info.external_attr
+    zip_out.writestr(zinfo, data, compresslevel=compresslevel)
+    return zinfo
+
+def write_package(source_path, dest_path, replaced_parts):
+    """Write dest_path from source_path, raw-copying every member not in replaced_parts"""
+    temp_path = dest_path + ".tmp"
+    with zipfile.ZipFile(source_path, 'r') as zip_in:
+        missing = set(replaced_parts) - set(zip_in.NameToInfo)
+        if missing:
+            raise ValueError(f"Parts not present in source package: {sorted(missing)}")
+        
+        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as zip_out:
+            for info in zip_in.infolist():
+                if info.filename in replaced_parts:
+                    write_member(zip_out, info, replaced_parts[info.filename])
+                else:
+                    write_member_raw(zip_out, info, read_member_raw(zip_in, info))
+    
+    os.replace(temp_path, dest_path)
+
+def patch_sheet_part(sheet_name, sheet_bytes, patch, shared_strings):
+    """Parse, patch and serialize one worksheet part; runs inside a pool worker"""
+    parser = etree.XMLParser(resolve_entities=False, huge_tree=True)
+    sheet_root = etree.fromstring(sheet_bytes, parser)
+    sheet_data = sheet_root.find("ns:sheetData", namespaces=NS)
+    if sheet_data is None:
+        raise ValueError(f"sheetData element not found in worksheet for '{sheet_name}'")
+    
+    cell_value_mapping = patch(sheet_root, shared_strings) if callable(patch) else patch
+    counts = update_cells_inline(sheet_data, cell_value_mapping, verbose=False)
+    return serialize_sheet(sheet_root), counts
+
+def apply_sheet_updates_parallel(source_path, dest_path, sheet_updates, max_workers=None, use_processes=False):
+    """Patch several worksheets of one workbook concurrently and write a single output package
+    
+    sheet_updates maps a sheet name to either a {cell_ref: value} mapping or a
+    callable(sheet_root, shared_strings) returning one. Callables must be
+    module-level functions when use_processes is set.
+    """
+    with zipfile.ZipFile(source_path, 'r') as zip_ref:
+        shared_strings = load_shared_strings_from_archive(zip_ref)
+        jobs = []
+        for sheet_name, patch in sheet_updates.items():
+            sheet_part = find_sheet_part(zip_ref, sheet_name)
+            jobs.append((sheet_name, sheet_part, zip_ref.read(sheet_part), patch))
+    
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    replaced_parts = {}
+    stats = {}
+    with executor_class(max_workers=max_workers or os.cpu_count()) as executor:
+        futures = {
+            executor.submit(patch_sheet_part, sheet_name, sheet_bytes, patch, shared_strings): (sheet_name, sheet_part)
+            for sheet_name, sheet_part, sheet_bytes, patch in jobs
+        }
+        for future, (sheet_name, sheet_part) in futures.items():
+            sheet_bytes, (replaced_count, created_rows, created_cells) = future.result()
+            replaced_parts[sheet_part] = sheet_bytes
+            stats[sheet_name] = {
+                'part': sheet_part,
+                'updated_cells': replaced_count,
+                'created_rows': created_rows,
+                'created_cells': created_cells,
+            }
+            print(f"  {sheet_name} ({sheet_part}): updated {replaced_count} cells")
+    
+    write_package(source_path, dest_path, replaced_parts)
+    print(f"Excel file written: {dest_path}")
+    return stats
+
+def central_directory_entries(zip_ref):
+    """Map member name -> (CRC32, file size, compressed size, compression) from the central directory"""
+    entries = {}
+    for info in zip_ref.infolist():
+        entries[info.filename] = (info.CRC, info.file_size, info.compress_size, info.compress_type)
+    return entries
+
+def verify_embedded_objects_preserved(source_path, output_path, prefixes=PRESERVED_PREFIXES):
+    """Compare source and output central directories for embedded parts and check modified XML parts are well-formed"""
+    with zipfile.ZipFile(source_path, 'r') as source_zip, zipfile.ZipFile(output_path, 'r') as output_zip:
+        source_entries = central_directory_entries(source_zip)
+        output_entries = central_directory_entries(output_zip)
+
+        missing_parts = []
+        added_parts = []
+        changed_parts = []
+        compression_changes = []
+
+        for name, (crc, size, compress_size, compress_type) in source_entries.items():
+            if not name.startswith(prefixes):
+                continue
+            if name not in output_entries:
+                missing_parts.append(name)
+                continue
+
+            out_crc, out_size, out_compress_size, out_compress_type = output_entries[name]
+            if out_crc != crc:
+                changed_parts.append({'part': name, 'field': 'crc', 'source': crc, 'output': out_crc})
+            if out_size != size:
+                changed_parts.append({'part': name, 'field': 'file_size', 'source': size, 'output': out_size})
+            if out_compress_type != compress_type:
+                compression_changes.append({'part': name, 'field': 'compress_type', 'source': compress_type, 'output': out_compress_type})
+            elif out_compress_size != compress_size:
+                compression_changes.append({'part': name, 'field': 'compress_size', 'source': compress_size, 'output': out_compress_size})
+
+        for name in output_entries:
+            if name.startswith(prefixes) and name not in source_entries:
+                added_parts.append(name)
+
+        modified_xml_parts = []
+        malformed_parts = []
+        for name, (crc, size, _, _) in output_entries.items():
+            if not name.endswith(XML_PART_SUFFIXES):
+                continue
+            source_entry = source_entries.get(name)
+            if source_entry is not None and source_entry[0] == crc and source_entry[1] == size:
+                continue
+
+            modified_xml_parts.append(name)
+            try:
+                etree.fromstring(output_zip.read(name), etree.XMLParser(resolve_entities=False, huge_tree=True))
+            except etree.XMLSyntaxError as e:
+                malformed_parts.append({'part': name, 'error': str(e)})
+
+    preserved = not (missing_parts or added_parts or changed_parts or malformed_parts)
+
+    print(f"Checked {sum(1 for name in source_entries if name.startswith(prefixes))} embedded parts and {len(modified_xml_parts)} modified XML parts")
+    for name in missing_parts:
+        print(f"  Missing in output: {name}")
+    for name in added_parts:
+        print(f"  Not present in source: {name}")
+    for change in changed_parts:
+        print(f"  Changed {change['part']} ({change['field']}): {change['source']} -> {change['output']}")
+    for change in compression_changes:
+        print(f"  Recompressed {change['part']} ({change['field']}): {change['source']} -> {change['output']}")
+    for malformed in malformed_parts:
+        print(f"  Malformed XML in {malformed['part']}: {malformed['error']}")
+
+    return {
+        'preserved': preserved,
+        'missing_parts': missing_parts,
+        'added_parts': added_parts,
+        'changed_parts': changed_parts,
+        'compression_changes': compression_changes,
+        'modified_xml_parts': modified_xml_parts,
+        'malformed_parts': malformed_parts,
+    }